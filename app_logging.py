@@ -0,0 +1,208 @@
+"""
+Structured logging for Smartcar Server
+Leveled, per-event sampled JSON logs written by a background thread; tokens are never logged
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # json or text
+LOG_PAYLOADS = os.getenv('LOG_PAYLOADS', 'false').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+# per-event sampling, e.g. "webhook.processed=0.01,vehicle.viewed=0.1"
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
+
+# per-request records that would flood the log at full rate; LOG_SAMPLE_RATES overrides
+DEFAULT_SAMPLE_RATES = {
+    'request.timing': 0.01,
+}
+
+REDACTED = '[redacted]'
+SECRET_KEYS = frozenset([
+    'access_token', 'refresh_token', 'token', 'authorization', 'code', 'challenge', 'client_secret'
+])
+
+ROOT_LOGGER = 'sc_server'
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        event, rate = item.split('=', 1)
+        rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+_sample_rates = dict(DEFAULT_SAMPLE_RATES, **parse_sample_rates(LOG_SAMPLE_RATES))
+
+
+def redact(value):
+    """Copy of value with secret-looking keys masked, recursively"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SECRET_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        ts = datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds')
+        fields = ' '.join(f"{key}={value}" for key, value in getattr(record, 'fields', {}).items())
+        line = f"{ts} {record.levelname.lower()} {record.name} {record.getMessage()} {fields}".rstrip()
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller and restarts its writer thread after fork
+
+    Records are queued unformatted; JSON encoding and the stdout write happen on
+    the listener thread. When the queue is full the record is dropped, counted and
+    passed to the drop observers (metrics.py exports them as a counter).
+    """
+
+    def __init__(self, target, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        # observers are called as fn(record) for every dropped record
+        self.drop_observers = []
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # a forked worker inherits a queue whose listener thread did not survive
+            self.queue = queue.Queue(maxsize=self.maxsize)
+            self._listener = logging.handlers.QueueListener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            for observer in self.drop_observers:
+                try:
+                    observer(record)
+                except Exception:
+                    # logging the failure would only queue another record
+                    pass
+
+    def flush(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class StructLogger:
+    """logger.info('event.name', key=value, ...) with level check and sampling before any formatting"""
+
+    def __init__(self, logger):
+        self._logger = logger
+
+    def _log(self, level, event, exc_info, fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            fields['sample_rate'] = rate
+        self._logger.log(level, event, exc_info=exc_info, extra={'fields': redact(fields)})
+
+    def debug(self, event, **fields):
+        self._log(logging.DEBUG, event, None, fields)
+
+    def info(self, event, **fields):
+        self._log(logging.INFO, event, None, fields)
+
+    def warning(self, event, **fields):
+        self._log(logging.WARNING, event, None, fields)
+
+    def error(self, event, exc_info=False, **fields):
+        self._log(logging.ERROR, event, exc_info, fields)
+
+    def exception(self, event, **fields):
+        self._log(logging.ERROR, event, True, fields)
+
+    def payload(self, event, payload, **fields):
+        """Log a full request/response body at debug level, only when LOG_PAYLOADS=true"""
+        if LOG_PAYLOADS:
+            self._log(logging.DEBUG, event, None, dict(fields, payload=payload))
+
+
+_handler = None
+
+
+def configure_logging():
+    """Attach the queue-backed handler to the app's logger tree once per process"""
+    global _handler
+    if _handler is not None:
+        return _handler
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(TextFormatter() if LOG_FORMAT == 'text' else JsonFormatter())
+    _handler = AsyncQueueHandler(stream)
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_handler)
+    root.propagate = False
+    atexit.register(_handler.flush)
+    return _handler
+
+
+def get_logger(name):
+    configure_logging()
+    return StructLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
+
+
+def on_dropped_record(observer):
+    """Call observer(record) whenever a record is dropped because the log queue is full"""
+    handler = configure_logging()
+    if observer not in handler.drop_observers:
+        handler.drop_observers.append(observer)
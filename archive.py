@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Columnar archive of cold signal history for Smartcar Server
+Moves webhook_data rows older than ARCHIVE_AFTER_DAYS into Parquet files, one directory
+per vehicle and month, on a local path or object storage (s3://, gs://). Exports read the
+archive back for ranges that start before the newest cutoff it was written with.
+
+    python archive.py                      # archive everything older than ARCHIVE_AFTER_DAYS
+    python archive.py --before 2025-01-01 --vehicle-id <id>
+
+Layout: <ARCHIVE_URI>/vehicle=<smartcar id>/month=<YYYY-MM>/data.parquet
+Each vehicle-month is one file, merged by row id whenever rows are added to it, and is
+written before the rows are deleted; a rerun after an interrupted run merges the same
+rows again instead of duplicating them. The newest row of every event type stays in
+the table, so the latest-signal reads keep working for vehicles that went idle.
+<ARCHIVE_URI>/_manifest.json records the latest cutoff any run used; dataset reads skip it.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, select
+
+from app_logging import get_logger
+from db_backend import make_engine
+from models import Vehicle, WebhookData
+
+load_dotenv()
+
+ARCHIVE_URI = os.getenv('ARCHIVE_URI')  # unset disables archive reads
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BATCH_ROWS = int(os.getenv('ARCHIVE_BATCH_ROWS', '50000'))  # rows per Parquet row group and read batch
+
+MANIFEST = '_manifest.json'
+
+log = get_logger('archive')
+
+vehicles = Vehicle.__table__
+webhook_data = WebhookData.__table__
+
+# same attributes as the export query's rows
+ArchivedRow = namedtuple('ArchivedRow', ['id', 'vehicle_id', 'event_type', 'timestamp', 'created_at', 'data', 'raw_data'])
+
+
+def archive_enabled():
+    return bool(ARCHIVE_URI)
+
+
+def archive_cutoff(now=None):
+    """Rows older than this belong in the archive"""
+    return (now or datetime.utcnow()) - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+
+def _schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('vehicle_id', pa.string()),
+        ('event_type', pa.dictionary(pa.int8(), pa.string())),
+        ('timestamp', pa.timestamp('us')),
+        ('created_at', pa.timestamp('us')),
+        # decoded from data so scans don't need to parse JSON
+        ('value', pa.float64()),
+        ('latitude', pa.float64()),
+        ('longitude', pa.float64()),
+        ('data', pa.string()),
+        ('raw_data', pa.string()),
+    ])
+
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([('vehicle', pa.string()), ('month', pa.string())]), flavor='hive')
+
+
+def filesystem(uri=None):
+    """(pyarrow filesystem, root path) for a local directory or an object store URI"""
+    from pyarrow import fs
+    uri = uri or ARCHIVE_URI
+    if '://' not in uri:
+        uri = os.path.abspath(uri)
+        os.makedirs(uri, exist_ok=True)
+    return fs.FileSystem.from_uri(uri)
+
+
+def typed_values(data):
+    """(value, latitude, longitude) from a stored signal's JSON"""
+    try:
+        body = json.loads(data).get('value', {}) if data else {}
+    except ValueError:
+        return None, None, None
+    if not isinstance(body, dict):
+        return None, None, None
+    value = body.get('value', body.get('capacity', (body.get('values') or {}).get('activeLimit')))
+    return (
+        float(value) if isinstance(value, (int, float)) else None,
+        body.get('latitude') if isinstance(body.get('latitude'), (int, float)) else None,
+        body.get('longitude') if isinstance(body.get('longitude'), (int, float)) else None,
+    )
+
+
+def _month_table(vehicle_id, rows):
+    import pyarrow as pa
+    columns = {name: [] for name in _schema().names}
+    for row in rows:
+        value, latitude, longitude = typed_values(row.data)
+        for name, item in (('id', row.id), ('vehicle_id', vehicle_id), ('event_type', row.event_type),
+                           ('timestamp', row.timestamp), ('created_at', row.created_at), ('value', value),
+                           ('latitude', latitude), ('longitude', longitude), ('data', row.data),
+                           ('raw_data', row.raw_data)):
+            columns[name].append(item)
+    return pa.Table.from_pydict(columns, schema=_schema())
+
+
+def _write_month(fs, root, vehicle_id, month, rows):
+    """Merge rows into the vehicle-month's file; rows already archived are replaced, not repeated"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    from pyarrow.fs import FileType
+    directory = f"{root}/vehicle={quote(vehicle_id, safe='')}/month={month}"
+    path = f"{directory}/data.parquet"
+    table = _month_table(vehicle_id, rows)
+    fs.create_dir(directory, recursive=True)
+    if fs.get_file_info(path).type != FileType.NotFound:
+        existing = pq.read_table(path, filesystem=fs, schema=_schema())
+        existing = existing.filter(pc.invert(pc.is_in(existing['id'], value_set=table['id'])))
+        table = pa.concat_tables([existing, table]).sort_by([('timestamp', 'ascending'), ('id', 'ascending')])
+    # dataset discovery skips names starting with '.', so readers never see the partial file
+    tmp = f"{directory}/.data.parquet.tmp"
+    pq.write_table(table, tmp, filesystem=fs, compression='zstd', row_group_size=ARCHIVE_BATCH_ROWS)
+    fs.move(tmp, path)
+    return path
+
+
+def archived_before(uri=None):
+    """Latest cutoff any archive run used, or None when nothing was archived"""
+    from pyarrow.fs import FileType
+    fs, root = filesystem(uri)
+    path = f"{root}/{MANIFEST}"
+    if fs.get_file_info(path).type == FileType.NotFound:
+        return None
+    with fs.open_input_stream(path) as stream:
+        return datetime.fromisoformat(json.loads(stream.read())['archived_before'])
+
+
+def _record_cutoff(fs, root, cutoff, uri=None):
+    """Raise the manifest's high-water mark to cutoff; written before any row leaves the table"""
+    current = archived_before(uri)
+    if current is not None and current >= cutoff:
+        return
+    tmp = f"{root}/.{MANIFEST}.tmp"
+    with fs.open_output_stream(tmp) as stream:
+        stream.write(json.dumps({'archived_before': cutoff.isoformat()}).encode())
+    fs.move(tmp, f"{root}/{MANIFEST}")
+
+
+def _latest_ids(conn, vehicle_pk):
+    """Ids of the newest row per event type, which stay in the table for the latest-signal reads"""
+    event_types = conn.execute(
+        select(webhook_data.c.event_type).where(webhook_data.c.vehicle_id == vehicle_pk).distinct()
+    ).scalars().all()
+    return [
+        conn.execute(
+            select(webhook_data.c.id)
+            .where(webhook_data.c.vehicle_id == vehicle_pk, webhook_data.c.event_type == event_type)
+            .order_by(webhook_data.c.timestamp.desc(), webhook_data.c.id.desc())
+            .limit(1)
+        ).scalar_one()
+        for event_type in event_types
+    ]
+
+
+def archive_vehicle(engine, fs, root, vehicle_pk, vehicle_id, cutoff):
+    """Write one vehicle's rows older than cutoff to Parquet, then delete them; returns the row count"""
+    archived = 0
+    max_id = None
+    with engine.connect() as conn:
+        conditions = [webhook_data.c.vehicle_id == vehicle_pk, webhook_data.c.timestamp < cutoff]
+        keep = _latest_ids(conn, vehicle_pk)
+        if keep:
+            conditions.append(webhook_data.c.id.notin_(keep))
+        stmt = (
+            select(webhook_data.c.id, webhook_data.c.event_type, webhook_data.c.timestamp,
+                   webhook_data.c.created_at, webhook_data.c.data, webhook_data.c.raw_data)
+            .where(*conditions)
+            .order_by(webhook_data.c.timestamp, webhook_data.c.id)
+        )
+        month_rows, month = [], None
+        for row in conn.execution_options(yield_per=5000).execute(stmt):
+            row_month = row.timestamp.strftime('%Y-%m')
+            if month_rows and row_month != month:
+                _write_month(fs, root, vehicle_id, month, month_rows)
+                archived += len(month_rows)
+                month_rows = []
+            month_rows.append(row)
+            month = row_month
+            max_id = row.id if max_id is None else max(max_id, row.id)
+        if month_rows:
+            _write_month(fs, root, vehicle_id, month, month_rows)
+            archived += len(month_rows)
+    if archived:
+        # only rows that were read; anything inserted since keeps its place in the hot table
+        with engine.begin() as conn:
+            conn.execute(delete(webhook_data).where(*conditions, webhook_data.c.id <= max_id))
+    return archived
+
+
+def archive_cold_history(engine, cutoff=None, vehicle_id=None, uri=None):
+    """Archive every vehicle's rows older than cutoff; returns {smartcar id: rows archived}"""
+    cutoff = cutoff or archive_cutoff()
+    fs, root = filesystem(uri)
+    stmt = (
+        select(vehicles.c.id, vehicles.c.smartcar_vehicle_id)
+        .join_from(vehicles, webhook_data, webhook_data.c.vehicle_id == vehicles.c.id)
+        .where(webhook_data.c.timestamp < cutoff)
+        .group_by(vehicles.c.id, vehicles.c.smartcar_vehicle_id)
+        .having(func.count(webhook_data.c.id) > 0)
+    )
+    if vehicle_id:
+        stmt = stmt.where(vehicles.c.smartcar_vehicle_id == vehicle_id)
+    with engine.connect() as conn:
+        targets = conn.execute(stmt).all()
+    if targets:
+        # an interrupted run leaves the mark raised, which only costs exports an archive read
+        _record_cutoff(fs, root, cutoff, uri)
+
+    results = {}
+    for vehicle_pk, smartcar_id in targets:
+        try:
+            results[smartcar_id] = archive_vehicle(engine, fs, root, vehicle_pk, smartcar_id, cutoff)
+            log.info("archive.vehicle", vehicle_id=smartcar_id, rows=results[smartcar_id], cutoff=cutoff)
+        except Exception as e:
+            log.error("archive.vehicle_failed", vehicle_id=smartcar_id, error=str(e))
+    return results
+
+
+def reaches_archive(start, uri=None):
+    """True when a history range starting at start may include archived rows"""
+    if not (uri or archive_enabled()):
+        return False
+    cutoff = archived_before(uri)
+    return cutoff is not None and (start is None or start < cutoff)
+
+
+def archived_rows(vehicle_id=None, event_types=None, start=None, end=None, include_raw=False, uri=None):
+    """Archived rows matching the export filters in (timestamp, id) order, read a batch at a time
+
+    Partitions outside the vehicle and month range are never opened. Each vehicle's months
+    are read in order and the vehicles are merged, holding one batch per vehicle.
+    """
+    import pyarrow.dataset as ds
+    fs, root = filesystem(uri)
+    try:
+        dataset = ds.dataset(root, filesystem=fs, format='parquet', partitioning=_partitioning())
+    except (FileNotFoundError, OSError):
+        return
+    if not dataset.files:
+        return
+
+    partitions, conditions = [], []
+    if vehicle_id:
+        partitions.append(ds.field('vehicle') == vehicle_id)
+    if start:
+        partitions.append(ds.field('month') >= start.strftime('%Y-%m'))
+        conditions.append(ds.field('timestamp') >= start)
+    if end:
+        partitions.append(ds.field('month') <= end.strftime('%Y-%m'))
+        conditions.append(ds.field('timestamp') < end)
+    if event_types:
+        conditions.append(ds.field('event_type').isin(event_types))
+
+    fragments = {}
+    for fragment in dataset.get_fragments(filter=_all_of(partitions)):
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        fragments.setdefault(keys['vehicle'], []).append((keys['month'], fragment))
+    if not fragments:
+        return
+    columns = ['id', 'vehicle_id', 'event_type', 'timestamp', 'created_at', 'data'] + (['raw_data'] if include_raw else [])
+    batch_size = max(ARCHIVE_BATCH_ROWS // len(fragments), 1000)
+    streams = [
+        _fragment_rows([fragment for _, fragment in sorted(months, key=lambda item: item[0])],
+                       columns, _all_of(conditions), batch_size)
+        for months in fragments.values()
+    ]
+    yield from heapq.merge(*streams, key=lambda row: (row.timestamp, row.id))
+
+
+def _all_of(conditions):
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _fragment_rows(fragments, columns, expression, batch_size):
+    """ArchivedRows from fragments in the order given; each file is sorted by (timestamp, id)"""
+    for fragment in fragments:
+        for batch in fragment.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            for record in batch.to_pylist():
+                yield ArchivedRow(
+                    record['id'], record['vehicle_id'], record['event_type'], record['timestamp'],
+                    record['created_at'], record['data'], record.get('raw_data')
+                )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--uri', default=ARCHIVE_URI, help='archive location (default: ARCHIVE_URI)')
+    parser.add_argument('--before', type=datetime.fromisoformat,
+                        help=f"archive rows older than this (default: {ARCHIVE_AFTER_DAYS} days ago)")
+    parser.add_argument('--vehicle-id', help='archive one vehicle only')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database_url:
+        print("DATABASE_URL env variable or --database-url is required")
+        return 1
+    if not args.uri:
+        print("ARCHIVE_URI env variable or --uri is required")
+        return 1
+
+    engine = make_engine(args.database_url)
+    try:
+        results = archive_cold_history(engine, args.before, args.vehicle_id, args.uri)
+    finally:
+        engine.dispose()
+    print(f"Archived {sum(results.values())} rows from {len(results)} vehicles to {args.uri}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
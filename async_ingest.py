@@ -0,0 +1,262 @@
+"""
+Async webhook ingest service for Smartcar Server
+Plain ASGI app that stores VEHICLE_STATE deliveries through asyncpg, run next to the Flask app:
+
+    uvicorn async_ingest:app --host 0.0.0.0 --port 8001
+"""
+
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app_logging import get_logger
+from db_backend import async_database_url, dialect_insert
+import metrics
+import query_log
+from models import User, Vehicle, WebhookData, DEFAULT_USER_ID, PLACEHOLDER_TOKEN
+from signals import SIGNAL_EVENT_TYPES, event_metadata, enhanced_signal_data
+
+load_dotenv()
+
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '20'))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv('ASYNC_DB_MAX_OVERFLOW', '10'))
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv('ASYNC_DB_POOL_TIMEOUT', '30'))
+ASYNC_INGEST_MAX_BODY_BYTES = int(os.getenv('ASYNC_INGEST_MAX_BODY_BYTES', str(1024 * 1024)))
+
+log = get_logger('async_ingest')
+
+# the Flask models' tables, used through Core so no app context is needed
+users = User.__table__
+vehicles = Vehicle.__table__
+webhook_data = WebhookData.__table__
+
+_engine = None
+_default_user_pk = None
+
+
+def get_engine():
+    """The service's own async engine and connection pool, created on first use"""
+    global _engine
+    if _engine is None:
+        database_url = os.getenv('DATABASE_URL')
+        if not database_url:
+            raise ValueError("DATABASE_URL env variable not found")
+        _engine = create_async_engine(
+            async_database_url(database_url),
+            pool_size=ASYNC_DB_POOL_SIZE,
+            max_overflow=ASYNC_DB_MAX_OVERFLOW,
+            pool_timeout=ASYNC_DB_POOL_TIMEOUT,
+            pool_pre_ping=True
+        )
+        metrics.instrument_engine(_engine.sync_engine)
+        query_log.instrument_engine(_engine.sync_engine)
+    return _engine
+
+
+async def dispose_engine():
+    global _engine
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = None
+
+
+async def default_user_pk(conn):
+    """Primary key of the default user, created atomically on first use and cached"""
+    global _default_user_pk
+    if _default_user_pk is None:
+        stmt = dialect_insert(users, conn.dialect.name).values(
+            smartcar_user_id=DEFAULT_USER_ID,
+            email='default@example.com'
+        ).on_conflict_do_nothing(index_elements=['smartcar_user_id'])
+        await conn.execute(stmt)
+        _default_user_pk = (await conn.execute(
+            select(users.c.id).where(users.c.smartcar_user_id == DEFAULT_USER_ID)
+        )).scalar_one()
+    return _default_user_pk
+
+
+async def ingest_vehicle_state(data):
+    """Store every mapped signal of a VEHICLE_STATE payload in one transaction; returns the count"""
+    vehicle_info = data["data"]["vehicle"]
+    vehicle_id = vehicle_info["id"]
+    metadata = event_metadata(data)
+    raw_data = json.dumps(data)
+    now = datetime.utcnow()
+    timestamp = now  # naive UTC, same clock as the Flask webhook path
+
+    rows = []
+    codes = []
+    for signal in data["data"]["signals"]:
+        event_type = SIGNAL_EVENT_TYPES.get(signal.get("code", ""))
+        if event_type is None:
+            metrics.count_signal(signal.get("code", ""), 'unknown', 'async_webhook')
+            log.warning("ingest.unknown_signal", signal_code=signal.get('code', ''), vehicle_id=vehicle_id)
+            continue
+        codes.append(signal["code"])
+        rows.append({
+            'event_type': event_type,
+            'timestamp': timestamp,
+            'data': json.dumps(enhanced_signal_data(signal, metadata)),
+            'raw_data': raw_data
+        })
+
+    async with get_engine().begin() as conn:
+        # upsert the vehicle: attributes from the webhook, placeholder tokens when it is new
+        stmt = dialect_insert(vehicles, conn.dialect.name).values(
+            smartcar_vehicle_id=vehicle_id,
+            user_id=await default_user_pk(conn),
+            make=vehicle_info.get("make"),
+            model=vehicle_info.get("model"),
+            year=vehicle_info.get("year"),
+            access_token=PLACEHOLDER_TOKEN,
+            refresh_token=PLACEHOLDER_TOKEN,
+            token_expires_at=now,
+            last_webhook_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['smartcar_vehicle_id'],
+            set_={
+                'make': stmt.excluded.make,
+                'model': stmt.excluded.model,
+                'year': stmt.excluded.year,
+                'last_webhook_at': now,
+                'updated_at': now
+            }
+        ).returning(vehicles.c.id)
+        vehicle_pk = (await conn.execute(stmt)).scalar_one()
+        if rows:
+            await conn.execute(webhook_data.insert(), [dict(row, vehicle_id=vehicle_pk) for row in rows])
+
+    for code in codes:
+        metrics.count_signal(code, 'stored', 'async_webhook')
+
+    log.info(
+        "ingest.processed", source='async_webhook', event_id=metadata['event_id'],
+        webhook_id=metadata['webhook_id'], vehicle_id=vehicle_id, stored=len(rows), mode=metadata['mode']
+    )
+    return len(rows)
+
+
+def handle_verification(data):
+    challenge = data.get('payload', {}).get('challenge')
+    management_token = os.getenv('SMARTCAR_MANAGEMENT_TOKEN')
+
+    if not management_token:
+        return 500, {'error': 'management token not configured'}
+    if not challenge:
+        return 400, {'error': 'no challenge provided'}
+
+    hmac_hash = hmac.new(
+        management_token.encode('utf-8'),
+        challenge.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+    return 200, {'challenge': hmac_hash}
+
+
+async def handle_webhook(data):
+    """Same contract as the Flask /webhook route; returns (status, body)"""
+    try:
+        log.payload("webhook.payload", data)
+        if data.get('eventName') == 'verify':
+            return handle_verification(data)
+
+        if data.get("eventType") == "VEHICLE_STATE" and "data" in data and "signals" in data["data"]:
+            await ingest_vehicle_state(data)
+            return 200, {'status': 'success', 'message': 'VEHICLE_STATE payload processed'}
+
+        log.warning("webhook.unsupported", event_type=data.get("eventType"), event_name=data.get("eventName"))
+        return 400, {'status': 'error', 'message': 'Unsupported webhook payload format'}
+
+    except Exception as e:
+        log.exception("webhook.failed")
+        return 500, {'status': 'error', 'message': str(e)}
+
+
+async def read_body(receive):
+    """Request body, or None if it grows past ASYNC_INGEST_MAX_BODY_BYTES or the client disconnects"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > ASYNC_INGEST_MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def respond(send, status, body):
+    payload = json.dumps(body).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                get_engine()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await dispose_engine()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'] == '/health' and scope['method'] == 'GET':
+        await respond(send, 200, {'status': 'ok'})
+        return
+    if scope['path'] == '/metrics' and scope['method'] == 'GET':
+        body, content_type = metrics.render_metrics()
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        return
+    if scope['path'] != '/webhook' or scope['method'] != 'POST':
+        await respond(send, 404, {'error': 'not found'})
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        await respond(send, 413, {'status': 'error', 'message': 'Payload too large'})
+        return
+    try:
+        data = json.loads(body)
+    except ValueError:
+        await respond(send, 400, {'status': 'error', 'message': 'Invalid JSON'})
+        return
+    if not isinstance(data, dict):
+        await respond(send, 400, {'status': 'error', 'message': 'Unsupported webhook payload format'})
+        return
+
+    status, payload = await handle_webhook(data)
+    await respond(send, status, payload)
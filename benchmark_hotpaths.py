@@ -0,0 +1,173 @@
+"""
+Micro-benchmarks for Smartcar Server's hottest code paths
+WebhookData serialization, signal mapping, ingest writes and the latest-signal queries,
+parameterized by payload size and history depth. Runs against a temporary SQLite database.
+check_benchmarks.py saves a baseline and fails a run that regresses against it.
+"""
+
+import copy
+import itertools
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+from db_backend import bulk_insert
+from generate_fleet import VehicleSimulator, delivery_rows, WEBHOOK_COLUMNS
+from main import create_app, ingest_vehicle_state, store_webhook_data, upsert_vehicle_tokens
+from models import db, Vehicle, WebhookData, PLACEHOLDER_TOKEN
+from signals import EVENT_TYPES, SIGNAL_EVENT_TYPES, enhanced_signal_data, event_metadata
+
+PAYLOAD_SIGNALS = [5, 50, 500]
+HISTORY_DEPTHS = [100, 1000, 10000]
+WRITE_ROUNDS = 50
+
+
+def vehicle_state_payload(vehicle_id, signal_count):
+    """A VEHICLE_STATE delivery with signal_count signals cycling through every mapped code"""
+    rng = random.Random(signal_count)
+    end = datetime.utcnow()
+    simulator = VehicleSimulator(rng, 75, 5, 4)
+    signals = [signal for _, delivery in simulator.history(end - timedelta(days=365), end) for signal in delivery]
+    by_code = {}
+    for signal in signals:
+        by_code.setdefault(signal['code'], []).append(signal)
+    cycle = itertools.cycle(list(SIGNAL_EVENT_TYPES))
+    return {
+        'eventId': f"bench-{signal_count}",
+        'eventType': 'VEHICLE_STATE',
+        'meta': {'webhookId': 'bench', 'deliveryId': f"bench-{signal_count}", 'mode': 'LIVE',
+                 'signalCount': signal_count, 'deliveredAt': 0},
+        'data': {
+            'user': {'id': 'bench-user'},
+            'vehicle': {'id': vehicle_id, 'make': 'TESLA', 'model': 'Model 3', 'year': 2022},
+            'signals': [rng.choice(by_code[next(cycle)]) for _ in range(signal_count)]
+        }
+    }
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    database = tmp_path_factory.mktemp('bench') / 'bench.db'
+    app = create_app({'SECRET_KEY': 'bench', 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{database}"})
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture(scope='session')
+def histories(app):
+    """Smartcar vehicle id per history depth, each with that many stored signals"""
+    vehicle_ids = {}
+    end = datetime.utcnow()
+    with app.app_context():
+        for depth in HISTORY_DEPTHS:
+            vehicle_id = f"bench-history-{depth}"
+            upsert_vehicle_tokens(vehicle_id, PLACEHOLDER_TOKEN, PLACEHOLDER_TOKEN, end)
+            db.session.commit()
+            vehicle_pk = db.session.execute(
+                db.select(Vehicle.id).filter_by(smartcar_vehicle_id=vehicle_id)
+            ).scalar_one()
+            rng = random.Random(depth)
+            simulator = VehicleSimulator(rng, 75, 5, 4)
+            rows = list(itertools.islice(
+                delivery_rows(vehicle_pk, vehicle_id, simulator.history(end - timedelta(days=3650), end), True, rng),
+                depth
+            ))
+            with db.engine.begin() as conn:
+                bulk_insert(conn, WebhookData.__table__, WEBHOOK_COLUMNS, rows)
+            vehicle_ids[depth] = vehicle_id
+    return vehicle_ids
+
+
+@pytest.fixture
+def clear_signals(app_context):
+    """Deletes one vehicle's stored signals, so write benchmarks start every round from the same table"""
+    def clear(vehicle_id):
+        db.session.execute(delete(WebhookData).where(WebhookData.vehicle_id.in_(
+            select(Vehicle.id).filter_by(smartcar_vehicle_id=vehicle_id)
+        )))
+        db.session.commit()
+    return clear
+
+
+@pytest.fixture
+def stored_entry(app_context):
+    """One stored signal whose raw_data holds a 50-signal delivery"""
+    payload = vehicle_state_payload('bench-entry', 50)
+    signal = payload['data']['signals'][0]
+    store_webhook_data('bench-entry', SIGNAL_EVENT_TYPES[signal['code']],
+                       enhanced_signal_data(signal, event_metadata(payload)), payload)
+    entry = WebhookData.query.order_by(WebhookData.id.desc()).first()
+    entry.data, entry.raw_data  # undefer before timing
+    return entry
+
+
+def test_to_dict(benchmark, stored_entry):
+    benchmark(stored_entry.to_dict)
+
+
+def test_data_dict(benchmark, stored_entry):
+    benchmark(lambda: stored_entry.data_dict)
+
+
+@pytest.mark.parametrize('signal_count', PAYLOAD_SIGNALS)
+def test_signal_mapping(benchmark, signal_count):
+    """The per-signal mapping the webhook path runs before writing"""
+    payload = vehicle_state_payload('bench-mapping', signal_count)
+
+    def map_signals():
+        metadata = event_metadata(payload)
+        return [
+            (SIGNAL_EVENT_TYPES[signal['code']], json.dumps(enhanced_signal_data(signal, metadata)))
+            for signal in payload['data']['signals'] if signal.get('code') in SIGNAL_EVENT_TYPES
+        ]
+
+    assert len(benchmark(map_signals)) == signal_count
+
+
+def test_store_webhook_data(benchmark, clear_signals):
+    payload = vehicle_state_payload('bench-store', 5)
+    signal = payload['data']['signals'][0]
+    data = enhanced_signal_data(signal, event_metadata(payload))
+    assert benchmark.pedantic(store_webhook_data, ('bench-store', SIGNAL_EVENT_TYPES[signal['code']], data, payload),
+                              setup=lambda: clear_signals('bench-store'), rounds=WRITE_ROUNDS)
+
+
+@pytest.mark.parametrize('signal_count', PAYLOAD_SIGNALS)
+def test_ingest_vehicle_state(benchmark, clear_signals, signal_count):
+    """Full webhook ingest: vehicle lookup, mapping and the per-signal inserts"""
+    vehicle_id = f"bench-ingest-{signal_count}"
+    payload = vehicle_state_payload(vehicle_id, signal_count)
+    assert benchmark.pedantic(ingest_vehicle_state, (copy.deepcopy(payload),),
+                              setup=lambda: clear_signals(vehicle_id), rounds=WRITE_ROUNDS) == signal_count
+
+
+@pytest.mark.parametrize('depth', HISTORY_DEPTHS)
+def test_latest_for(benchmark, app_context, histories, depth):
+    """The five latest-signal lookups behind /vehicle and latest-signals"""
+    vehicle_pk = db.session.execute(
+        db.select(Vehicle.id).filter_by(smartcar_vehicle_id=histories[depth])
+    ).scalar_one()
+
+    def latest_signals():
+        entries = [WebhookData.latest_for(vehicle_pk, event_type) for event_type in EVENT_TYPES]
+        db.session.rollback()  # drop the identity map so every round hits the database
+        return entries
+
+    assert any(benchmark(latest_signals))
+
+
+@pytest.mark.parametrize('depth', HISTORY_DEPTHS)
+def test_latest_signals_endpoint(benchmark, app, histories, depth):
+    client = app.test_client()
+    url = f"/api/vehicle/{histories[depth]}/latest-signals"
+    assert benchmark(client.get, url).status_code == 200
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark regression check for Smartcar Server
+Runs benchmark_hotpaths.py against the baseline saved on this machine and fails when
+any benchmark's BENCHMARK_FIELD (min) is more than BENCHMARK_MAX_REGRESSION percent slower.
+Baselines are per machine and not committed, so a run without one for this interpreter
+and platform fails instead of passing with nothing to compare; CI saves it on main first.
+
+    python check_benchmarks.py --save   # on main: record the baseline
+    python check_benchmarks.py          # on a branch: compare against it
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+from pytest_benchmark.utils import get_machine_id
+
+BENCHMARK_MAX_REGRESSION = float(os.getenv('BENCHMARK_MAX_REGRESSION', '20'))  # percent
+# the fastest round is the least disturbed by other load on the machine; means of microsecond
+# benchmarks move by 20-30% between identical runs
+BENCHMARK_FIELD = os.getenv('BENCHMARK_FIELD', 'min')
+# one baseline per machine, kept apart from ad-hoc --benchmark-save runs
+BENCHMARK_BASELINE_DIR = os.getenv('BENCHMARK_BASELINE_DIR', '.benchmarks/baseline')
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def baseline_dir():
+    return os.path.join(ROOT, BENCHMARK_BASELINE_DIR)
+
+
+def baseline_file():
+    """The newest baseline saved for this machine, or None
+
+    pytest-benchmark keeps one directory per interpreter and platform and only warns
+    when --benchmark-compare finds nothing there, so look for the file up front.
+    """
+    files = sorted(glob.glob(os.path.join(baseline_dir(), get_machine_id(), '*_baseline.json')))
+    return files[-1] if files else None
+
+
+def run_pytest(options):
+    command = [sys.executable, '-m', 'pytest', 'benchmark_hotpaths.py', '-q',
+               f"--benchmark-storage=file://{baseline_dir()}"] + options
+    return subprocess.run(command, cwd=ROOT).returncode
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--save', action='store_true', help='replace the baseline with this run')
+    parser.add_argument('--max-regression', type=float, default=BENCHMARK_MAX_REGRESSION,
+                        help='allowed slowdown of each benchmark, in percent')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.save:
+        shutil.rmtree(baseline_dir(), ignore_errors=True)
+        returncode = run_pytest(['--benchmark-save=baseline'])
+        if returncode == 0:
+            print(f"Baseline saved under {BENCHMARK_BASELINE_DIR}")
+        return returncode
+
+    baseline = baseline_file()
+    if baseline is None:
+        print(f"No {get_machine_id()} baseline under {BENCHMARK_BASELINE_DIR}; "
+              f"run `python check_benchmarks.py --save` on main on this machine first")
+        return 1
+    returncode = run_pytest([f"--benchmark-compare={baseline}",
+                             f"--benchmark-compare-fail={BENCHMARK_FIELD}:{args.max_regression:g}%"])
+    if returncode != 0:
+        print(f"Benchmarks failed or regressed more than {args.max_regression:g}% against the baseline")
+    return returncode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
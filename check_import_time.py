@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for Smartcar Server
+Fails when `import main` is slower than IMPORT_TIME_BUDGET_MS or builds the app at import
+"""
+
+import os
+import subprocess
+import sys
+
+IMPORT_TIME_BUDGET_MS = float(os.getenv('IMPORT_TIME_BUDGET_MS', '1000'))
+IMPORT_TIME_RUNS = int(os.getenv('IMPORT_TIME_RUNS', '3'))
+
+# importing main must not need env vars, build the app or the Smartcar client
+PROBE = (
+    "import main; "
+    "assert main._app is None, 'app was built at import'; "
+    "assert main._client is None, 'Smartcar client was built at import'"
+)
+
+
+def measure():
+    """Run one cold import under -X importtime; returns (total ms, slowest modules)"""
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('SECRET_KEY', 'DATABASE_URL', 'SMARTCAR_CLIENT_ID',
+                          'SMARTCAR_CLIENT_SECRET', 'SMARTCAR_REDIRECT_URI')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # one space after the separator, more for nested imports
+        modules.append((int(cumulative) / 1000, name[1:].rstrip()))
+    total = sum(ms for ms, name in modules if not name.startswith(' '))
+    return total, sorted(modules, reverse=True)[:10]
+
+
+def main():
+    try:
+        runs = [measure() for _ in range(IMPORT_TIME_RUNS)]
+    except RuntimeError as e:
+        print(f"import main failed: {e}")
+        return 1
+    total, slowest = min(runs)
+    print(f"import main: {total:.0f} ms (best of {IMPORT_TIME_RUNS}, budget {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f} ms  {name.strip()}")
+    if total > IMPORT_TIME_BUDGET_MS:
+        print("Import-time budget exceeded")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Database backend configuration for Smartcar Server
+Normalizes DATABASE_URL for PostgreSQL (pg8000) and embedded SQLite (WAL) installs
+"""
+
+import csv
+import hashlib
+import io
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+
+from sqlalchemy import create_engine, event, func, select
+
+# sqlite tuning, overridable per install
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', '-65536'))  # negative = KiB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_WRITER_QUEUE_SIZE = int(os.getenv('SQLITE_WRITER_QUEUE_SIZE', '10000'))
+
+if SQLITE_SYNCHRONOUS not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+    raise ValueError(f"SQLITE_SYNCHRONOUS must be OFF, NORMAL, FULL or EXTRA, got {SQLITE_SYNCHRONOUS}")
+
+
+def normalize_database_url(database_url):
+    """Rewrite DATABASE_URL into the SQLAlchemy URL the app should use"""
+    if database_url.startswith('postgres://'):
+        return database_url.replace('postgres://', 'postgresql+pg8000://', 1)
+    if database_url.startswith('postgresql://'):
+        return database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
+    return database_url
+
+
+def async_database_url(database_url):
+    """Rewrite DATABASE_URL for the asyncpg driver used by the async ingest service"""
+    for prefix in ('postgres://', 'postgresql://', 'postgresql+pg8000://'):
+        if database_url.startswith(prefix):
+            return database_url.replace(prefix, 'postgresql+asyncpg://', 1)
+    if database_url.startswith('postgresql+asyncpg://'):
+        return database_url
+    raise ValueError("async ingest requires a PostgreSQL DATABASE_URL")
+
+
+def is_sqlite_url(database_url):
+    return database_url.startswith('sqlite')
+
+
+def sqlite_engine_options():
+    """Engine options for the embedded SQLite mode"""
+    return {
+        'connect_args': {
+            'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+            'check_same_thread': False,
+        },
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers run alongside the single writer
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+
+def install_sqlite_pragmas(engine):
+    """Apply WAL journaling and tuned pragmas to every new SQLite connection"""
+    event.listen(engine, 'connect', _apply_sqlite_pragmas)
+
+
+class SQLiteWriter:
+    """Single writer thread that serializes ingest writes against SQLite
+
+    SQLite allows one writer at a time; funnelling ingest through one thread
+    avoids "database is locked" retries between request threads.
+    """
+
+    def __init__(self, app, max_queue=SQLITE_WRITER_QUEUE_SIZE):
+        self.app = app
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_started(self):
+        # started lazily so a forking server never inherits a dead thread
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) for the writer thread and return a Future"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def _run(self):
+        while True:
+            fn, args, kwargs, future = self._queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                with self.app.app_context():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+
+class LeaderLock:
+    """Cross-process lock that lets one gunicorn worker run the background services
+
+    PostgreSQL: a session-level pg_try_advisory_lock on a dedicated connection, released
+    when that connection closes, including when the worker dies. SQLite: an flock on a
+    file next to the database, released by the OS when the process exits.
+    """
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        digest = hashlib.sha256(name.encode('utf-8')).digest()
+        self.key = int.from_bytes(digest[:8], 'big', signed=True)
+        self._conn = None
+        self._backend_pid = None
+        self._file = None
+
+    def try_acquire(self):
+        """True while this process holds the lock; takes it when it is free"""
+        if self.engine.dialect.name == 'postgresql':
+            return self._try_advisory_lock()
+        if self.engine.dialect.name == 'sqlite':
+            return self._try_flock()
+        return True
+
+    def _try_advisory_lock(self):
+        if self._conn is not None:
+            try:
+                # a reconnect behind our back means a new session that no longer holds the lock
+                if self._conn.execute(select(func.pg_backend_pid())).scalar() == self._backend_pid:
+                    return True
+            except Exception:
+                pass
+            self.release()
+        conn = self.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+        try:
+            if conn.execute(select(func.pg_try_advisory_lock(self.key))).scalar():
+                self._conn = conn
+                self._backend_pid = conn.execute(select(func.pg_backend_pid())).scalar()
+                return True
+        except Exception:
+            conn.close()
+            raise
+        conn.close()
+        return False
+
+    def _try_flock(self):
+        if self._file is not None:
+            return True
+        database = self.engine.url.database
+        if not database or database == ':memory:':
+            return True  # private to this process
+        import fcntl
+        lock_file = open(f"{database}.leader", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._file = lock_file
+        return True
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def dialect_insert(table, dialect_name):
+    """INSERT construct with native ON CONFLICT support for the given dialect"""
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Upserts are not supported on {dialect_name}")
+    return insert(table)
+
+
+def make_engine(database_url):
+    """Standalone engine for scripts that run outside the Flask app"""
+    database_url = normalize_database_url(database_url)
+    if is_sqlite_url(database_url):
+        engine = create_engine(database_url, **sqlite_engine_options())
+        install_sqlite_pragmas(engine)
+        return engine
+    return create_engine(database_url)
+
+
+def bulk_insert(conn, table, columns, rows):
+    """Write row tuples (in columns order) with COPY on PostgreSQL, a multi-row insert elsewhere"""
+    if conn.dialect.name != 'postgresql':
+        conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # an unquoted empty field is NULL in CSV COPY
+        writer.writerow(value.isoformat(sep=' ') if isinstance(value, datetime) else value for value in row)
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        # pg8000 streams the buffer for COPY ... FROM STDIN
+        cursor.execute(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", stream=buffer)
+    finally:
+        cursor.close()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Streaming export of signal history for Smartcar Server
+Rows are read through a server-side cursor (yield_per) and written as NDJSON or CSV one
+batch at a time, so memory stays flat however large the export is. Ranges that reach
+past the archive cutoff also read the Parquet archive (see archive.py), merged in by
+timestamp. Shared by the
+GET /api/export endpoint and this CLI:
+
+    python export_webhooks.py --vehicle-id <id> --event-type Location.PreciseLocation --start 2025-01-01 > out.ndjson
+    python export_webhooks.py --format csv --start 2025-01-01 --end 2025-02-01 --output january.csv
+"""
+
+import argparse
+import csv
+import heapq
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from archive import archived_rows, reaches_archive
+from db_backend import make_engine
+from models import Vehicle, WebhookData
+
+load_dotenv()
+
+EXPORT_YIELD_PER = int(os.getenv('EXPORT_YIELD_PER', '1000'))
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+vehicles = Vehicle.__table__
+webhook_data = WebhookData.__table__
+
+CSV_COLUMNS = ['id', 'vehicle_id', 'event_type', 'timestamp', 'created_at', 'data']
+
+
+def parse_time(value):
+    """ISO date or datetime from a query string or flag; None when empty"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"invalid date {value!r}, expected ISO format like 2025-01-31 or 2025-01-31T12:00:00")
+
+
+def export_query(vehicle_id=None, event_types=None, start=None, end=None, include_raw=False):
+    """SELECT for the export in (timestamp, id) order; start is inclusive and end exclusive"""
+    columns = [
+        webhook_data.c.id, vehicles.c.smartcar_vehicle_id.label('vehicle_id'), webhook_data.c.event_type,
+        webhook_data.c.timestamp, webhook_data.c.created_at, webhook_data.c.data
+    ]
+    if include_raw:
+        columns.append(webhook_data.c.raw_data)
+    stmt = select(*columns).join_from(webhook_data, vehicles, webhook_data.c.vehicle_id == vehicles.c.id)
+    if vehicle_id:
+        stmt = stmt.where(vehicles.c.smartcar_vehicle_id == vehicle_id)
+    if event_types:
+        stmt = stmt.where(webhook_data.c.event_type.in_(event_types))
+    if start:
+        stmt = stmt.where(webhook_data.c.timestamp >= start)
+    if end:
+        stmt = stmt.where(webhook_data.c.timestamp < end)
+    return stmt.order_by(webhook_data.c.timestamp, webhook_data.c.id)
+
+
+def stream_rows(engine, stmt, yield_per=EXPORT_YIELD_PER):
+    """Rows from a server-side cursor, yield_per at a time; the connection closes with the generator"""
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=yield_per).execute(stmt)
+        for partition in result.partitions():
+            yield from partition
+
+
+def merge_rows(*streams):
+    """Merge streams sorted by (timestamp, id); a row found in more than one is written once"""
+    last_id = None
+    for row in heapq.merge(*streams, key=lambda row: (row.timestamp, row.id)):
+        # an interrupted archive run can leave a row in both the archive and the table
+        if row.id != last_id:
+            yield row
+        last_id = row.id
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def ndjson_chunks(rows, include_raw=False):
+    """One JSON object per line; stored JSON columns are embedded as-is rather than re-encoded"""
+    lines = []
+    for row in rows:
+        head = json.dumps({
+            'id': row.id, 'vehicle_id': row.vehicle_id, 'event_type': row.event_type,
+            'timestamp': _isoformat(row.timestamp), 'created_at': _isoformat(row.created_at)
+        })
+        line = f"{head[:-1]}, \"data\": {row.data or 'null'}"
+        if include_raw:
+            line += f", \"raw_data\": {row.raw_data or 'null'}"
+        lines.append(line + '}\n')
+        if len(lines) >= EXPORT_YIELD_PER:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def csv_chunks(rows, include_raw=False):
+    """CSV with a header row; data and raw_data stay JSON strings"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS + (['raw_data'] if include_raw else []))
+    count = 0
+    for row in rows:
+        values = [row.id, row.vehicle_id, row.event_type, _isoformat(row.timestamp),
+                  _isoformat(row.created_at), row.data]
+        if include_raw:
+            values.append(row.raw_data)
+        writer.writerow(values)
+        count += 1
+        if count % EXPORT_YIELD_PER == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_chunks(engine, fmt, include_raw=False, **filters):
+    """Text chunks of the export in fmt ('ndjson' or 'csv')"""
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    rows = stream_rows(engine, export_query(include_raw=include_raw, **filters))
+    if reaches_archive(filters.get('start')):
+        # the newest row of each event type stays in the table, so the two overlap in time
+        rows = merge_rows(archived_rows(include_raw=include_raw, **filters), rows)
+    chunks = ndjson_chunks if fmt == 'ndjson' else csv_chunks
+    return chunks(rows, include_raw)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--format', choices=list(FORMATS), default='ndjson')
+    parser.add_argument('--vehicle-id', help='Smartcar vehicle id')
+    parser.add_argument('--event-type', action='append', dest='event_types',
+                        help='e.g. TractionBattery.StateOfCharge; repeat for several')
+    parser.add_argument('--start', type=parse_time, help='inclusive, ISO date or datetime')
+    parser.add_argument('--end', type=parse_time, help='exclusive, ISO date or datetime')
+    parser.add_argument('--include-raw', action='store_true', help='add the full delivery payload')
+    parser.add_argument('--output', help='file to write (default: stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database_url:
+        print("DATABASE_URL env variable or --database-url is required", file=sys.stderr)
+        return 1
+
+    engine = make_engine(args.database_url)
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for chunk in export_chunks(engine, args.format, include_raw=args.include_raw,
+                                   vehicle_id=args.vehicle_id, event_types=args.event_types,
+                                   start=args.start, end=args.end):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        engine.dispose()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
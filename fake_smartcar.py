@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Local Smartcar API stand-in for Smartcar Server
+Serves the Connect, auth and vehicle API endpoints the app uses, with configurable
+latency, error rate and 429 rate limiting, for offline integration and perf tests.
+
+    python fake_smartcar.py --port 9000 --latency-ms 150 --error-rate 0.02 --rate-limit-rps 20
+
+then start the app with the printed SMARTCAR_*_URL variables. Knobs can be changed while
+it runs with POST /_fake/config (same names as the flags) and counters read from GET /_fake/stats.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+API_PREFIX = '/v1.0'
+
+MODELS = [('TESLA', 'Model 3'), ('TESLA', 'Model Y'), ('FORD', 'Mustang Mach-E'), ('HYUNDAI', 'Ioniq 5'),
+          ('KIA', 'EV6'), ('CHEVROLET', 'Bolt EV'), ('VOLKSWAGEN', 'ID.4'), ('RIVIAN', 'R1T')]
+
+DEFAULT_CONFIG = {
+    'latency_ms': 0.0,       # added to every response
+    'jitter_ms': 0.0,        # +/- uniform jitter on top of latency_ms
+    'error_rate': 0.0,       # fraction of calls answered with a 500
+    'rate_limit_rate': 0.0,  # fraction of calls answered with a 429
+    'rate_limit_rps': 0.0,   # app-wide token bucket; calls over it get a 429, 0 disables
+    'retry_after': 1,        # Retry-After seconds on random 429s
+    'vehicles': 3,           # vehicles returned by GET /vehicles for every token
+    'strict_refresh': False, # reject reused refresh tokens like the real single-use tokens
+    'endpoints': {},         # per-endpoint overrides, e.g. {"location": {"latency_ms": 2000}}
+}
+
+
+class FakeSmartcar:
+    """Shared state behind the request handler: knobs, token bookkeeping and counters"""
+
+    def __init__(self, config=None, seed=None):
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.spent_refresh_tokens = set()
+        self.stats = {}
+        self._tokens = self.config['rate_limit_rps']
+        self._last_refill = time.monotonic()
+
+    def update(self, changes):
+        with self.lock:
+            unknown = set(changes) - set(DEFAULT_CONFIG)
+            if unknown:
+                raise ValueError(f"unknown settings: {', '.join(sorted(unknown))}")
+            self.config.update(changes)
+            return dict(self.config)
+
+    def record(self, endpoint, status):
+        with self.lock:
+            counts = self.stats.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def setting(self, endpoint, name):
+        return self.config['endpoints'].get(endpoint, {}).get(name, self.config[name])
+
+    def delay(self, endpoint):
+        latency = self.setting(endpoint, 'latency_ms')
+        jitter = self.setting(endpoint, 'jitter_ms')
+        with self.lock:
+            seconds = max(latency + self.rng.uniform(-jitter, jitter), 0) / 1000
+        if seconds:
+            time.sleep(seconds)
+
+    def fault(self, endpoint):
+        """(status, retry_after) for an injected failure, or None"""
+        with self.lock:
+            rps = self.config['rate_limit_rps']
+            if rps:
+                now = time.monotonic()
+                self._tokens = min(self._tokens + (now - self._last_refill) * rps, rps)
+                self._last_refill = now
+                if self._tokens < 1:
+                    return 429, max(int((1 - self._tokens) / rps + 0.999), 1)
+                self._tokens -= 1
+            roll = self.rng.random()
+        if roll < self.setting(endpoint, 'rate_limit_rate'):
+            return 429, self.config['retry_after']
+        if roll < self.setting(endpoint, 'rate_limit_rate') + self.setting(endpoint, 'error_rate'):
+            return 500, None
+        return None
+
+    def spend_refresh_token(self, token):
+        """False if token was already spent and strict_refresh is on"""
+        with self.lock:
+            if token in self.spent_refresh_tokens and self.config['strict_refresh']:
+                return False
+            self.spent_refresh_tokens.add(token)
+            return True
+
+
+def vehicle_ids(access_token, count):
+    digest = hashlib.sha256(access_token.encode()).hexdigest()[:8]
+    return [f"fake-{digest}-{index:04d}" for index in range(count)]
+
+
+def vehicle_state(vehicle_id):
+    """Deterministic per-vehicle values that drift slowly with the clock"""
+    seed = int(hashlib.sha256(vehicle_id.encode()).hexdigest()[:8], 16)
+    minutes = time.time() / 60
+    make, model = MODELS[seed % len(MODELS)]
+    charging = (int(minutes / 90) + seed) % 5 == 0
+    percent = ((seed % 60) + 30 + (minutes % 120 if charging else -(minutes % 60) / 2)) % 100
+    return {
+        'info': {'id': vehicle_id, 'make': make, 'model': model, 'year': 2018 + seed % 8},
+        'location': {'latitude': 37.7749 + (seed % 1000) / 10000, 'longitude': -122.4194 - (seed % 700) / 10000},
+        'odometer': {'distance': 10000 + seed % 50000 + minutes / 30},
+        'battery': {'percentRemaining': round(max(percent, 5) / 100, 2), 'range': round(max(percent, 5) * 4.2, 1)},
+        'charge': {'isPluggedIn': charging, 'state': 'CHARGING' if charging else 'NOT_CHARGING'},
+    }
+
+
+def endpoint_for(method, path):
+    """Short endpoint name used for stats and per-endpoint overrides"""
+    parts = [part for part in path[len(API_PREFIX):].split('/') if part]
+    if path == '/oauth/token':
+        return 'token'
+    if path == '/oauth/authorize':
+        return 'authorize'
+    if parts == ['vehicles']:
+        return 'vehicles'
+    if parts == ['user']:
+        return 'user'
+    if len(parts) == 2 and parts[0] == 'vehicles':
+        return 'info'
+    if len(parts) >= 3 and parts[0] == 'vehicles':
+        return '/'.join(parts[2:])
+    return f"{method} {path}"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fake = None  # FakeSmartcar, set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None, endpoint=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('sc-request-id', str(uuid.uuid4()))
+        self.send_header('sc-unit-system', 'metric')
+        self.send_header('sc-data-age', datetime.now(timezone.utc).isoformat())
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+        if endpoint:
+            self.fake.record(endpoint, status)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _access_token(self):
+        auth = self.headers.get('Authorization', '')
+        return auth[len('Bearer '):] if auth.startswith('Bearer ') else None
+
+    def _handle(self, method):
+        url = urlsplit(self.path)
+        body = self._body()
+
+        if url.path == '/_fake/config':
+            if method == 'POST':
+                try:
+                    return self._send(200, self.fake.update(json.loads(body or b'{}')))
+                except ValueError as e:
+                    return self._send(400, {'error': str(e)})
+            return self._send(200, self.fake.config)
+        if url.path == '/_fake/stats':
+            return self._send(200, self.fake.stats)
+
+        endpoint = endpoint_for(method, url.path)
+        self.fake.delay(endpoint)
+        fault = self.fake.fault(endpoint)
+        if fault:
+            status, retry_after = fault
+            headers = {'Retry-After': retry_after} if retry_after else None
+            message = 'Rate limit exceeded' if status == 429 else 'Injected server error'
+            return self._send(status, {'error': 'fake_error', 'message': message}, headers, endpoint)
+
+        if endpoint == 'authorize':
+            query = parse_qs(url.query)
+            redirect = query.get('redirect_uri', [''])[0]
+            params = {'code': f"fake-code-{uuid.uuid4().hex[:12]}"}
+            if 'state' in query:
+                params['state'] = query['state'][0]
+            self.send_response(302)
+            self.send_header('Location', f"{redirect}?{urlencode(params)}")
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return self.fake.record(endpoint, 302)
+        if endpoint == 'token':
+            return self._token(parse_qs(body.decode()), endpoint)
+
+        access_token = self._access_token()
+        if not access_token:
+            return self._send(401, {'error': 'authentication_error', 'message': 'Missing access token'},
+                              endpoint=endpoint)
+        parts = [part for part in url.path[len(API_PREFIX):].split('/') if part]
+        if endpoint == 'vehicles':
+            query = parse_qs(url.query)
+            limit = int(query.get('limit', ['10'])[0])
+            offset = int(query.get('offset', ['0'])[0])
+            ids = vehicle_ids(access_token, self.fake.config['vehicles'])
+            return self._send(200, {'vehicles': ids[offset:offset + limit],
+                                    'paging': {'count': len(ids), 'offset': offset}}, endpoint=endpoint)
+        if endpoint == 'user':
+            return self._send(200, {'id': f"fake-user-{access_token[:8]}"}, endpoint=endpoint)
+
+        state = vehicle_state(parts[1])
+        if endpoint == 'batch':
+            requests = json.loads(body or b'{}').get('requests', [])
+            responses = []
+            for request in requests:
+                name = request['path'].strip('/') or 'info'
+                if name in state:
+                    responses.append({'path': request['path'], 'code': 200,
+                                      'headers': {'sc-data-age': datetime.now(timezone.utc).isoformat()},
+                                      'body': state[name]})
+                else:
+                    responses.append({'path': request['path'], 'code': 404, 'headers': {},
+                                      'body': {'error': 'not_found', 'message': 'Unknown path'}})
+            return self._send(200, {'responses': responses}, endpoint=endpoint)
+        if endpoint in state:
+            return self._send(200, state[endpoint], endpoint=endpoint)
+        return self._send(404, {'error': 'not_found', 'message': f"No fake for {url.path}"}, endpoint=endpoint)
+
+    def _token(self, form, endpoint):
+        grant = form.get('grant_type', [''])[0]
+        if grant == 'refresh_token':
+            if not self.fake.spend_refresh_token(form.get('refresh_token', [''])[0]):
+                return self._send(401, {'error': 'invalid_grant', 'error_description': 'Refresh token already used'},
+                                  endpoint=endpoint)
+        elif grant != 'authorization_code':
+            return self._send(400, {'error': 'invalid_request', 'error_description': f"Bad grant_type {grant!r}"},
+                              endpoint=endpoint)
+        return self._send(200, {
+            'access_token': f"fake-access-{uuid.uuid4().hex}",
+            'refresh_token': f"fake-refresh-{uuid.uuid4().hex}",
+            'expires_in': 7200,
+            'refresh_expires_in': 5184000,
+            'token_type': 'Bearer'
+        }, endpoint=endpoint)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+def make_server(host='127.0.0.1', port=0, config=None, seed=None):
+    """A ThreadingHTTPServer for the fake; its FakeSmartcar is server.fake"""
+    fake = FakeSmartcar(config, seed)
+    handler = type('FakeSmartcarHandler', (Handler,), {'fake': fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.fake = fake
+    return server
+
+
+def base_urls(server):
+    """SMARTCAR_*_URL settings that point the app at server"""
+    host, port = server.server_address[:2]
+    origin = f"http://{host}:{port}"
+    return {
+        'SMARTCAR_API_URL': origin + API_PREFIX,
+        'SMARTCAR_AUTH_URL': origin + '/oauth/token',
+        'SMARTCAR_CONNECT_URL': origin,
+    }
+
+
+def start(host='127.0.0.1', port=0, config=None, seed=None):
+    """Run the fake on a background thread; returns the server"""
+    server = make_server(host, port, config, seed)
+    threading.Thread(target=server.serve_forever, name='fake-smartcar', daemon=True).start()
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency-ms', type=float, default=DEFAULT_CONFIG['latency_ms'])
+    parser.add_argument('--jitter-ms', type=float, default=DEFAULT_CONFIG['jitter_ms'])
+    parser.add_argument('--error-rate', type=float, default=DEFAULT_CONFIG['error_rate'])
+    parser.add_argument('--rate-limit-rate', type=float, default=DEFAULT_CONFIG['rate_limit_rate'])
+    parser.add_argument('--rate-limit-rps', type=float, default=DEFAULT_CONFIG['rate_limit_rps'])
+    parser.add_argument('--retry-after', type=int, default=DEFAULT_CONFIG['retry_after'])
+    parser.add_argument('--vehicles', type=int, default=DEFAULT_CONFIG['vehicles'])
+    parser.add_argument('--strict-refresh', action='store_true')
+    parser.add_argument('--seed', type=int)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {name: value for name, value in vars(args).items() if name in DEFAULT_CONFIG}
+    server = make_server(args.host, args.port, config, args.seed)
+    print("Fake Smartcar listening; start the app with:")
+    for name, value in base_urls(server).items():
+        print(f"  export {name}={value}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Synthetic fleet data generator for Smartcar Server
+Creates users, vehicles and months of VEHICLE_STATE history (trips, charging sessions,
+parked periods) across all five event types, for index and query scale testing.
+
+    python generate_fleet.py --users 100 --vehicles 1000 --months 6
+    python generate_fleet.py --database-url postgresql://localhost/sc_scale --vehicles 5000 --jobs 8
+
+PostgreSQL is loaded with COPY, other databases with batched multi-row inserts.
+Vehicles get placeholder tokens so the refresh scheduler and poller leave them alone.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from db_backend import make_engine, bulk_insert
+from models import db, User, Vehicle, WebhookData, PLACEHOLDER_TOKEN
+from signals import SIGNAL_EVENT_TYPES, enhanced_signal_data
+
+load_dotenv()
+
+FLEET_BATCH_ROWS = int(os.getenv('FLEET_BATCH_ROWS', '50000'))  # rows per COPY / insert batch and transaction
+
+users = User.__table__
+vehicles = Vehicle.__table__
+webhook_data = WebhookData.__table__
+
+WEBHOOK_COLUMNS = ('vehicle_id', 'event_type', 'timestamp', 'data', 'raw_data', 'created_at')
+
+MODELS = [
+    ('TESLA', 'Model 3', 75), ('TESLA', 'Model Y', 78), ('FORD', 'Mustang Mach-E', 88),
+    ('HYUNDAI', 'Ioniq 5', 77), ('KIA', 'EV6', 77), ('CHEVROLET', 'Bolt EV', 65),
+    ('VOLKSWAGEN', 'ID.4', 82), ('RIVIAN', 'R1T', 135),
+]
+
+# (latitude, longitude) centres vehicles are spread around
+CITIES = [(37.7749, -122.4194), (34.0522, -118.2437), (47.6062, -122.3321), (40.7128, -74.0060),
+          (41.8781, -87.6298), (30.2672, -97.7431), (42.3601, -71.0589)]
+
+KWH_PER_KM = 0.18
+
+
+def epoch_millis(when):
+    # generated timestamps are naive UTC, like datetime.utcnow()
+    return int(when.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+class VehicleSimulator:
+    """Walks one vehicle through driving, charging and parked periods, yielding deliveries
+
+    Each delivery is (timestamp, [signal, ...]) in the VEHICLE_STATE signal format.
+    """
+
+    def __init__(self, rng, capacity_kwh, interval_minutes, parked_hours):
+        self.rng = rng
+        self.capacity_kwh = capacity_kwh
+        self.interval = timedelta(minutes=interval_minutes)
+        self.parked_interval = timedelta(hours=parked_hours)
+        city = rng.choice(CITIES)
+        self.home = (city[0] + rng.uniform(-0.2, 0.2), city[1] + rng.uniform(-0.2, 0.2))
+        self.position = self.home
+        self.odometer = rng.uniform(1000, 60000)
+        self.soc = rng.uniform(40, 90)
+        self.charge_limit = rng.choice([80, 80, 90, 100])
+
+    def _signal(self, code, body, when):
+        name = SIGNAL_EVENT_TYPES[code].split('.', 1)
+        millis = epoch_millis(when)
+        return {'code': code, 'name': name[1], 'group': name[0], 'body': body,
+                'meta': {'oemUpdatedAt': millis - self.rng.randint(0, 30000), 'retrievedAt': millis}}
+
+    def _state(self, when, location=True):
+        signals = [
+            self._signal('tractionbattery-stateofcharge', {'value': round(self.soc, 1)}, when),
+            self._signal('odometer-traveleddistance', {'value': round(self.odometer, 1)}, when),
+        ]
+        if location:
+            signals.insert(0, self._signal(
+                'location-preciselocation',
+                {'latitude': round(self.position[0], 6), 'longitude': round(self.position[1], 6)}, when
+            ))
+        return signals
+
+    def trip(self, start):
+        """Drive for 10-90 minutes at a steady speed on a wandering heading"""
+        minutes = self.rng.randint(10, 90)
+        speed_kmh = self.rng.uniform(25, 90)
+        heading = self.rng.uniform(0, 2 * math.pi)
+        when = start
+        end = start + timedelta(minutes=minutes)
+        while when < end:
+            yield when, self._state(when)
+            step_km = speed_kmh * self.interval.total_seconds() / 3600
+            heading += self.rng.uniform(-0.6, 0.6)
+            # head home once far away so a vehicle stays around its city
+            if math.dist(self.position, self.home) > 0.5:
+                heading = math.atan2(self.home[0] - self.position[0], self.home[1] - self.position[1])
+            self.position = (self.position[0] + step_km / 111 * math.sin(heading),
+                             self.position[1] + step_km / 88 * math.cos(heading))
+            self.odometer += step_km
+            self.soc = max(self.soc - step_km * KWH_PER_KM / self.capacity_kwh * 100, 3)
+            when += self.interval
+        yield when, self._state(when)
+        return when
+
+    def charge(self, start):
+        """Charge to the limit, tapering above 80%"""
+        kw = self.rng.choice([7.2, 11, 50, 150])
+        when = start
+        yield when, self._state(when) + [
+            self._signal('charge-chargelimits', {'values': {'activeLimit': self.charge_limit}}, when)
+        ]
+        while self.soc < self.charge_limit - 0.5:
+            taper = 1.0 if self.soc < 80 else max((100 - self.soc) / 20, 0.15)
+            hours = self.interval.total_seconds() / 3600
+            self.soc = min(self.soc + kw * taper * hours / self.capacity_kwh * 100, self.charge_limit)
+            when += self.interval
+            yield when, self._state(when, location=False)
+        return when
+
+    def history(self, start, end):
+        """Deliveries from start to end in time order"""
+        for delivery in self._walk(start):
+            if delivery[0] >= end:
+                return
+            yield delivery
+
+    def _walk(self, start):
+        when = start
+        next_capacity = start
+        while True:
+            if when >= next_capacity:
+                yield when, [self._signal('tractionbattery-nominalcapacity', {'capacity': self.capacity_kwh}, when)]
+                next_capacity = when + timedelta(days=1)
+            if self.soc < self.rng.uniform(20, 35) or (when.hour >= 22 and self.soc < self.charge_limit - 10):
+                when = yield from self.charge(when)
+            elif 6 <= when.hour < 22 and self.rng.random() < 0.35:
+                when = yield from self.trip(when)
+            else:
+                # parked: an occasional snapshot with the vehicle standing still
+                yield when, self._state(when)
+            gap = self.parked_interval * self.rng.uniform(0.3, 1.0)
+            when += gap
+
+
+def delivery_rows(vehicle_pk, vehicle_id, deliveries, raw_data, rng):
+    """webhook_data rows for one vehicle's deliveries, stored as the webhook path stores them"""
+    for when, signals in deliveries:
+        millis = epoch_millis(when)
+        event_id = '%032x' % rng.getrandbits(128)
+        metadata = {'event_id': event_id, 'webhook_id': 'fleet-generator', 'delivery_id': event_id,
+                    'delivered_at': millis, 'mode': 'LIVE'}
+        raw = json.dumps({
+            'eventId': event_id, 'eventType': 'VEHICLE_STATE',
+            'meta': {'webhookId': 'fleet-generator', 'deliveryId': event_id, 'deliveredAt': millis,
+                     'mode': 'LIVE', 'signalCount': len(signals)},
+            'data': {'vehicle': {'id': vehicle_id}, 'signals': signals}
+        }) if raw_data else None
+        for signal in signals:
+            yield (vehicle_pk, SIGNAL_EVENT_TYPES[signal['code']], when,
+                   json.dumps(enhanced_signal_data(signal, metadata)), raw, when)
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_fleet(engine, user_count, vehicle_count, seed, end):
+    """Insert users and vehicles; returns [(vehicle pk, smartcar id, capacity kWh)]"""
+    rng = random.Random(seed)
+    prefix = f"fleet-{seed}"
+    with engine.begin() as conn:
+        conn.execute(users.insert(), [
+            {'smartcar_user_id': f"{prefix}-user-{index:06d}", 'email': f"{prefix}-user-{index:06d}@example.com",
+             'created_at': end, 'updated_at': end}
+            for index in range(user_count)
+        ])
+        user_pks = conn.execute(
+            select(users.c.id).where(users.c.smartcar_user_id.like(f"{prefix}-user-%")).order_by(users.c.id)
+        ).scalars().all()
+
+        fleet = []
+        rows = []
+        for index in range(vehicle_count):
+            make, model, capacity = rng.choice(MODELS)
+            smartcar_id = f"{prefix}-vehicle-{index:07d}"
+            fleet.append((smartcar_id, capacity))
+            rows.append({
+                'smartcar_vehicle_id': smartcar_id, 'user_id': user_pks[index % len(user_pks)],
+                'make': make, 'model': model, 'year': rng.randint(2018, 2025),
+                'access_token': PLACEHOLDER_TOKEN, 'refresh_token': PLACEHOLDER_TOKEN,
+                'token_expires_at': end, 'last_webhook_at': end, 'created_at': end, 'updated_at': end
+            })
+        for batch in batches(rows, FLEET_BATCH_ROWS):
+            conn.execute(vehicles.insert(), batch)
+        pks = dict(conn.execute(
+            select(vehicles.c.smartcar_vehicle_id, vehicles.c.id)
+            .where(vehicles.c.smartcar_vehicle_id.like(f"{prefix}-vehicle-%"))
+        ).all())
+    return [(pks[smartcar_id], smartcar_id, capacity) for smartcar_id, capacity in fleet]
+
+
+def load_history(database_url, fleet, start, end, options):
+    """Generate and write history for a slice of the fleet; returns the row count"""
+    engine = make_engine(database_url)
+    total = 0
+    try:
+        for vehicle_pk, smartcar_id, capacity in fleet:
+            rng = random.Random(f"{options['seed']}-{smartcar_id}")
+            simulator = VehicleSimulator(rng, capacity, options['interval_minutes'], options['parked_hours'])
+            rows = delivery_rows(vehicle_pk, smartcar_id, simulator.history(start, end), options['raw_data'], rng)
+            for batch in batches(rows, FLEET_BATCH_ROWS):
+                with engine.begin() as conn:
+                    bulk_insert(conn, webhook_data, WEBHOOK_COLUMNS, batch)
+                total += len(batch)
+    finally:
+        engine.dispose()
+    return total
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--months', type=float, default=3, help='history length, ending now')
+    parser.add_argument('--interval-minutes', type=float, default=5, help='sample interval while driving or charging')
+    parser.add_argument('--parked-hours', type=float, default=4, help='longest gap between parked snapshots')
+    parser.add_argument('--raw-data', action=argparse.BooleanOptionalAction, default=True,
+                        help='store the full delivery in raw_data like the webhook path does')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1,
+                        help='parallel loader processes (PostgreSQL only)')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database_url:
+        print("DATABASE_URL env variable or --database-url is required")
+        return 1
+
+    engine = make_engine(args.database_url)
+    db.metadata.create_all(engine)
+    jobs = 1 if engine.dialect.name == 'sqlite' else max(args.jobs, 1)
+
+    end = datetime.utcnow().replace(microsecond=0)
+    start = end - timedelta(days=30 * args.months)
+    options = {'seed': args.seed, 'interval_minutes': args.interval_minutes,
+               'parked_hours': args.parked_hours, 'raw_data': args.raw_data}
+
+    started = time.perf_counter()
+    fleet = create_fleet(engine, max(args.users, 1), args.vehicles, args.seed, end)
+    engine.dispose()
+    print(f"Created {args.users} users and {len(fleet)} vehicles")
+
+    if jobs == 1:
+        rows = load_history(args.database_url, fleet, start, end, options)
+    else:
+        slices = [fleet[index::jobs] for index in range(jobs)]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            rows = sum(pool.map(load_history, [args.database_url] * jobs, slices,
+                                [start] * jobs, [end] * jobs, [options] * jobs))
+
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {rows} webhook_data rows ({start:%Y-%m-%d} to {end:%Y-%m-%d}) "
+          f"in {elapsed:.1f}s, {rows / elapsed:,.0f} rows/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for Smartcar Server
+Preloads the app once in the master and starts background services in each worker after fork
+"""
+
+import os
+import shutil
+
+# get_app() in the preloading master must not start threads that fork would drop
+os.environ.setdefault('DEFER_BACKGROUND_SERVICES', 'true')
+# prometheus_client multiprocess mode: every worker writes its metrics here. It must exist before
+# the preloaded app is imported, and stale files from a previous run would be summed into /metrics
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/sc_server_metrics')
+shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+bind = f"0.0.0.0:{os.getenv('PORT', '10000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# the Smartcar rate budget is per process; each worker enforces its 1/workers share
+os.environ.setdefault('SMARTCAR_RATE_WORKERS', str(workers))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+preload_app = True
+
+
+def post_fork(server, worker):
+    import main
+    main.on_worker_fork()
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.mark_process_dead(worker.pid)
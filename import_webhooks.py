@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Bulk import of captured webhook deliveries for Smartcar Server
+Streams JSONL files (one delivery per line) through the webhook signal mapping and writes
+webhook_data in bounded batches: COPY on PostgreSQL, multi-row inserts elsewhere.
+
+    python import_webhooks.py deliveries.jsonl
+    python import_webhooks.py archive/ --batch-rows 100000
+
+Progress is checkpointed as a byte offset per file after every committed batch, so an
+interrupted import resumes where it stopped. A crash between a commit and the checkpoint
+write can repeat at most that one batch. Only newline-terminated lines are imported; a
+final line still being written is picked up by the next run, and the import exits with 1
+until it is. Pass --complete for finished files whose last line has no newline.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from db_backend import make_engine, bulk_insert, dialect_insert
+from models import db, User, Vehicle, WebhookData, DEFAULT_USER_ID, PLACEHOLDER_TOKEN
+from signals import SIGNAL_EVENT_TYPES, event_metadata, enhanced_signal_data
+
+load_dotenv()
+
+IMPORT_BATCH_ROWS = int(os.getenv('IMPORT_BATCH_ROWS', '50000'))  # webhook_data rows per transaction
+
+users = User.__table__
+vehicles = Vehicle.__table__
+webhook_data = WebhookData.__table__
+
+WEBHOOK_COLUMNS = ('vehicle_id', 'event_type', 'timestamp', 'data', 'raw_data', 'created_at')
+
+
+class Checkpoint:
+    """{file path: byte offset} saved atomically next to the import"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.offsets = json.load(f)
+
+    def offset(self, source):
+        return self.offsets.get(os.path.abspath(source), 0)
+
+    def save(self, source, offset):
+        self.offsets[os.path.abspath(source)] = offset
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.offsets, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class VehicleKeys:
+    """Smartcar vehicle id -> vehicles.id, creating placeholder vehicles for unknown ids"""
+
+    def __init__(self):
+        self._keys = {}
+        self._user_pk = None
+
+    def _default_user_pk(self, conn):
+        if self._user_pk is None:
+            conn.execute(dialect_insert(users, conn.dialect.name).values(
+                smartcar_user_id=DEFAULT_USER_ID, email='default@example.com'
+            ).on_conflict_do_nothing(index_elements=['smartcar_user_id']))
+            self._user_pk = conn.execute(
+                select(users.c.id).where(users.c.smartcar_user_id == DEFAULT_USER_ID)
+            ).scalar_one()
+        return self._user_pk
+
+    def resolve(self, conn, vehicle_infos):
+        """Keys for every vehicle in {smartcar id: vehicle info}; existing vehicles are left as they are"""
+        missing = [vehicle_id for vehicle_id in vehicle_infos if vehicle_id not in self._keys]
+        if missing:
+            now = datetime.utcnow()
+            user_pk = self._default_user_pk(conn)
+            conn.execute(
+                dialect_insert(vehicles, conn.dialect.name).on_conflict_do_nothing(
+                    index_elements=['smartcar_vehicle_id']
+                ),
+                [{
+                    'smartcar_vehicle_id': vehicle_id, 'user_id': user_pk,
+                    'make': vehicle_infos[vehicle_id].get('make'), 'model': vehicle_infos[vehicle_id].get('model'),
+                    'year': vehicle_infos[vehicle_id].get('year'),
+                    'access_token': PLACEHOLDER_TOKEN, 'refresh_token': PLACEHOLDER_TOKEN,
+                    'token_expires_at': now, 'created_at': now, 'updated_at': now
+                } for vehicle_id in missing]
+            )
+            self._keys.update(conn.execute(
+                select(vehicles.c.smartcar_vehicle_id, vehicles.c.id)
+                .where(vehicles.c.smartcar_vehicle_id.in_(missing))
+            ).all())
+        return self._keys
+
+
+def delivery_timestamp(data, fallback):
+    """When the delivery was received, in the naive UTC time the webhook path stores"""
+    delivered_at = data.get('meta', {}).get('deliveredAt')
+    if isinstance(delivered_at, (int, float)):
+        return datetime.fromtimestamp(delivered_at / 1000, timezone.utc).replace(tzinfo=None)
+    return fallback
+
+
+def delivery_rows(line, now, stats):
+    """(smartcar vehicle id, vehicle info, [row without vehicle key]) for one JSONL line, or None"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        stats['invalid'] += 1
+        return None
+    if not (isinstance(data, dict) and data.get('eventType') == 'VEHICLE_STATE'
+            and 'signals' in data.get('data', {})):
+        stats['skipped'] += 1
+        return None
+
+    vehicle_info = data['data']['vehicle']
+    metadata = event_metadata(data)
+    timestamp = delivery_timestamp(data, now)
+    raw_data = line.strip()  # the delivery as received, without re-encoding
+    rows = []
+    for signal in data['data']['signals']:
+        event_type = SIGNAL_EVENT_TYPES.get(signal.get('code', ''))
+        if event_type is None:
+            stats['unknown_signals'] += 1
+            continue
+        rows.append((event_type, timestamp, json.dumps(enhanced_signal_data(signal, metadata)), raw_data, now))
+    stats['deliveries'] += 1
+    return vehicle_info['id'], vehicle_info, rows
+
+
+def import_file(engine, source, checkpoint, batch_rows, stats, report, complete=False):
+    """Stream one JSONL file from its checkpointed offset; complete imports a final line without a newline"""
+    offset = checkpoint.offset(source)
+    size = os.path.getsize(source)
+    if offset >= size:
+        return
+
+    vehicle_keys = VehicleKeys()
+    pending = []  # (smartcar id, row without key)
+    pending_infos = {}
+    pending_rows = 0
+
+    def flush(end_offset):
+        nonlocal pending, pending_infos, pending_rows
+        with engine.begin() as conn:
+            keys = vehicle_keys.resolve(conn, pending_infos)
+            if pending:
+                bulk_insert(conn, webhook_data, WEBHOOK_COLUMNS,
+                            [(keys[vehicle_id],) + row for vehicle_id, row in pending])
+        checkpoint.save(source, end_offset)
+        stats['rows'] += pending_rows
+        pending, pending_infos, pending_rows = [], {}, 0
+        report()
+
+    with open(source, 'rb') as f:
+        f.seek(offset)
+        for raw in f:
+            if not raw.endswith(b'\n') and not complete:
+                # a writer may still be appending this line; leave it, and the checkpoint, for the next run
+                stats['incomplete'] += 1
+                break
+            offset += len(raw)
+            if not raw.strip():
+                continue
+            parsed = delivery_rows(raw.decode('utf-8'), datetime.utcnow(), stats)
+            if parsed is None:
+                continue
+            vehicle_id, vehicle_info, rows = parsed
+            pending_infos.setdefault(vehicle_id, vehicle_info)
+            pending.extend((vehicle_id, row) for row in rows)
+            pending_rows += len(rows)
+            # batches end on delivery boundaries so the checkpoint offset is always a line start
+            if pending_rows >= batch_rows:
+                flush(offset)
+        flush(offset)
+
+
+def jsonl_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith('.jsonl'):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='JSONL files or directories of *.jsonl')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--batch-rows', type=int, default=IMPORT_BATCH_ROWS)
+    parser.add_argument('--checkpoint', default='import_webhooks.checkpoint.json',
+                        help='offset file used to resume (delete it to import again from the start)')
+    parser.add_argument('--complete', action='store_true',
+                        help='files are finished: import a last line without a trailing newline too')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database_url:
+        print("DATABASE_URL env variable or --database-url is required")
+        return 1
+
+    engine = make_engine(args.database_url)
+    db.metadata.create_all(engine)
+    checkpoint = Checkpoint(args.checkpoint)
+    stats = dict.fromkeys(('deliveries', 'rows', 'skipped', 'invalid', 'unknown_signals', 'incomplete'), 0)
+    started = time.perf_counter()
+
+    def report():
+        elapsed = time.perf_counter() - started
+        print(f"{stats['deliveries']} deliveries, {stats['rows']} rows "
+              f"({stats['rows'] / elapsed:,.0f} rows/s), {stats['skipped']} skipped, {stats['invalid']} invalid")
+
+    try:
+        for source in jsonl_files(args.paths):
+            print(f"Importing {source} from byte {checkpoint.offset(source)}")
+            incomplete = stats['incomplete']
+            import_file(engine, source, checkpoint, args.batch_rows, stats, report, args.complete)
+            if stats['incomplete'] > incomplete:
+                print(f"Warning: {source} ends in a line without a newline; it was not imported. "
+                      f"Run again once the file is written, or with --complete if it is finished", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume from the checkpoint")
+        return 130
+    finally:
+        engine.dispose()
+    print(f"Import complete: {stats}")
+    # a left-over partial line is a delivery not imported yet; don't let a script treat this as done
+    return 1 if stats['incomplete'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
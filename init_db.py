@@ -1,50 +1,72 @@
 #!/usr/bin/env python3
 """
 Database initialization script for Smartcar Server
-This script creates all necessary database tables
+This script creates all necessary database tables and applies upgrade_schema(). It only
+needs DATABASE_URL: like the other CLIs it binds an engine to the models, without the app.
 """
 
+import argparse
 import os
+import sys
+
 from dotenv import load_dotenv
-from main import app, db
-from models import User, Vehicle, WebhookData, UserSession
+from sqlalchemy import func, insert, select
+
+from db_backend import make_engine
+from models import db, User, Vehicle, WebhookData, UserSession, DEFAULT_USER_ID, upgrade_schema
 
 load_dotenv()
 
-def init_database():
+def init_database(engine):
     """Initialize the database with all tables"""
-    with app.app_context():
-        print("Creating database tables...")
-        
-        # Create all tables
-        db.create_all()
-        
-        print("Database tables created successfully!")
-
+    print("Creating database tables...")
+    
+    # Create all tables
+    db.metadata.create_all(engine)
+    
+    print("Database tables created successfully!")
+    
+    # columns added since the tables were first created; must land before the new code serves
+    for change in upgrade_schema(engine):
+        print(f"Added {change}")
+    
+    with engine.begin() as conn:
         # Create a default user if none exists
-        default_user = User.query.first()
-        if not default_user:
-            default_user = User(
-                smartcar_user_id='default_user',
-                email='default@example.com'
-            )
-            db.session.add(default_user)
-            db.session.commit()
+        if conn.execute(select(User.__table__.c.id).limit(1)).first() is None:
+            conn.execute(insert(User.__table__).values(smartcar_user_id=DEFAULT_USER_ID, email='default@example.com'))
             print("Created default user")
         
         # Check table counts
-        user_count = User.query.count()
-        vehicle_count = Vehicle.query.count()
-        webhook_count = WebhookData.query.count()
-        session_count = UserSession.query.count()
-        
-        print(f"\nDatabase Status:")
-        print(f"Users: {user_count}")
-        print(f"Vehicles: {vehicle_count}")
-        print(f"Webhook Data Entries: {webhook_count}")
-        print(f"User Sessions: {session_count}")
-        
-        print("\nDatabase initialization complete!")
+        counts = {
+            model: conn.execute(select(func.count()).select_from(model.__table__)).scalar_one()
+            for model in (User, Vehicle, WebhookData, UserSession)
+        }
+    
+    print(f"\nDatabase Status:")
+    print(f"Users: {counts[User]}")
+    print(f"Vehicles: {counts[Vehicle]}")
+    print(f"Webhook Data Entries: {counts[WebhookData]}")
+    print(f"User Sessions: {counts[UserSession]}")
+    
+    print("\nDatabase initialization complete!")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.database_url:
+        print("DATABASE_URL env variable or --database-url is required")
+        return 1
+    
+    engine = make_engine(args.database_url)
+    try:
+        init_database(engine)
+    finally:
+        engine.dispose()
+    return 0
 
 if __name__ == '__main__':
-    init_database()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Webhook ingest load test for Smartcar Server
+Starts the app under gunicorn on a local database, replays VEHICLE_STATE payloads
+and reads them back, then reports throughput and p50/p95/p99 latency per endpoint as JSON.
+
+    python load_test.py --deliveries 2000 --concurrency 16 --output results.json
+    python load_test.py --payloads captured.jsonl --rate 200
+    python load_test.py --url http://localhost:8001 --endpoints webhook   # async ingest service
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# endpoint name -> (method, path template); reads use the vehicles written by the ingest phase
+READ_ENDPOINTS = {
+    'latest_signals': ('GET', '/api/vehicle/{vehicle_id}/latest-signals'),
+    'vehicle_info': ('GET', '/api/vehicle/{vehicle_id}/info'),
+    'vehicle_page': ('GET', '/vehicle?vehicle_id={vehicle_id}'),
+}
+ENDPOINTS = ['webhook'] + list(READ_ENDPOINTS)
+
+
+def vehicle_state_payload(vehicle_id, sequence):
+    """A VEHICLE_STATE delivery carrying all five mapped signals"""
+    now = int(time.time() * 1000)
+    meta = {'oemUpdatedAt': now - random.randint(0, 60000), 'retrievedAt': now}
+    return {
+        'eventId': str(uuid.uuid4()),
+        'eventType': 'VEHICLE_STATE',
+        'meta': {'webhookId': 'load-test', 'deliveryId': str(uuid.uuid4()), 'deliveredAt': now,
+                 'mode': 'LIVE', 'signalCount': 5},
+        'data': {
+            'user': {'id': 'load-test-user'},
+            'vehicle': {'id': vehicle_id, 'make': 'TESLA', 'model': 'Model 3', 'year': 2022},
+            'signals': [
+                {'code': 'location-preciselocation', 'name': 'PreciseLocation', 'group': 'Location',
+                 'body': {'latitude': 37.77 + random.uniform(-0.1, 0.1),
+                          'longitude': -122.42 + random.uniform(-0.1, 0.1)}, 'meta': meta},
+                {'code': 'odometer-traveleddistance', 'name': 'TraveledDistance', 'group': 'Odometer',
+                 'body': {'value': 10000 + sequence * 3.2}, 'meta': meta},
+                {'code': 'tractionbattery-stateofcharge', 'name': 'StateOfCharge', 'group': 'TractionBattery',
+                 'body': {'value': random.randint(10, 100)}, 'meta': meta},
+                {'code': 'tractionbattery-nominalcapacity', 'name': 'NominalCapacity', 'group': 'TractionBattery',
+                 'body': {'capacity': 75}, 'meta': meta},
+                {'code': 'charge-chargelimits', 'name': 'ChargeLimits', 'group': 'Charge',
+                 'body': {'values': {'activeLimit': 80}}, 'meta': meta},
+            ]
+        }
+    }
+
+
+def generated_payloads(count, vehicles):
+    vehicle_ids = [f"load-test-{index:05d}" for index in range(vehicles)]
+    for sequence in range(count):
+        yield vehicle_state_payload(vehicle_ids[sequence % vehicles], sequence)
+
+
+def file_payloads(path, count):
+    """VEHICLE_STATE payloads from a JSONL file, one delivery per line, cycled until count"""
+    payloads = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                payload = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(payload, dict) and payload.get('eventType') == 'VEHICLE_STATE':
+                payloads.append(payload)
+    if not payloads:
+        raise ValueError(f"no VEHICLE_STATE payloads in {path}")
+    for sequence in range(count):
+        yield payloads[sequence % len(payloads)]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Throughput, status counts and latency percentiles (ms) for one endpoint"""
+    latencies = sorted(ms for ms, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if not status.startswith('2'))
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'statuses': statuses,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None,
+        }
+    }
+
+
+def run_phase(base_url, requests_iter, concurrency, rate):
+    """Send (method, path, body) requests with concurrency workers
+
+    With rate > 0 the requests are scheduled open-loop at that many per second and
+    latency is measured from the scheduled start, so queueing behind a slow server
+    counts against it. With rate 0 every worker sends as fast as it can.
+    """
+    lock = threading.Lock()
+    samples = []
+    sequence = iter(enumerate(requests_iter))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                item = next(sequence, None)
+            if item is None:
+                return
+            index, (method, path, body) = item
+            scheduled = started + index / rate if rate else time.perf_counter()
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                response = session.request(method, base_url + path, json=body, timeout=30)
+                status = response.status_code
+            except requests.RequestException:
+                status = 'error'
+            ms = round((time.perf_counter() - scheduled) * 1000, 3)
+            with lock:
+                samples.append((ms, status))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            requests.get(base_url + '/', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not start within {timeout}s")
+
+
+def start_server(database_url, workers, workdir):
+    """gunicorn with the repo's config on a free port; returns (process, base_url)"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        SECRET_KEY=os.getenv('SECRET_KEY', 'load-test'),
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        TOKEN_REFRESH_SCHEDULER='false',
+        VEHICLE_POLLER='false',
+        PROMETHEUS_MULTIPROC_DIR=os.path.join(workdir, 'metrics'),
+        LOG_LEVEL=os.getenv('LOG_LEVEL', 'WARNING'),
+    )
+    os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    subprocess.run([sys.executable, 'init_db.py'], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=open(os.path.join(workdir, 'server.log'), 'w')
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_up(base_url, process)
+    except Exception:
+        process.terminate()
+        raise
+    return process, base_url
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, base_url):
+    if args.payloads:
+        payloads = list(file_payloads(args.payloads, args.deliveries))
+    else:
+        payloads = list(generated_payloads(args.deliveries, args.vehicles))
+    vehicle_ids = sorted({payload['data']['vehicle']['id'] for payload in payloads})
+
+    results = {}
+    if 'webhook' in args.endpoints:
+        samples, elapsed = run_phase(
+            base_url, (('POST', '/webhook', payload) for payload in payloads), args.concurrency, args.rate
+        )
+        results['webhook'] = summarize(samples, elapsed)
+        results['webhook']['signals_per_second'] = round(
+            sum(len(p['data']['signals']) for p in payloads) / elapsed, 1
+        ) if elapsed else None
+    for name, (method, template) in READ_ENDPOINTS.items():
+        if name not in args.endpoints:
+            continue
+        reads = ((method, template.format(vehicle_id=random.choice(vehicle_ids)), None)
+                 for _ in range(args.reads))
+        samples, elapsed = run_phase(base_url, reads, args.concurrency, args.rate)
+        results[name] = summarize(samples, elapsed)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--payloads', help='JSONL file of VEHICLE_STATE payloads (default: generated)')
+    parser.add_argument('--deliveries', type=int, default=1000, help='webhook deliveries to send')
+    parser.add_argument('--vehicles', type=int, default=50, help='vehicles for generated payloads')
+    parser.add_argument('--reads', type=int, default=500, help='requests per read endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=0, help='requests per second, 0 for as fast as possible')
+    parser.add_argument('--endpoints', nargs='+', default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument('--database-url', help='local database to start the app on (default: temporary SQLite)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--url', help='benchmark an already running server instead of starting one')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='sc_load_test_')
+    database_url = args.database_url or f"sqlite:///{os.path.join(workdir, 'load_test.db')}"
+
+    process = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            process, base_url = start_server(database_url, args.workers, workdir)
+        results = run(args, base_url)
+    except Exception:
+        print(f"load test failed; server log and database kept in {workdir}", file=sys.stderr)
+        raise
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {
+            'url': args.url, 'database': 'external' if args.url else database_url.split(':', 1)[0],
+            'workers': None if args.url else args.workers, 'payloads': args.payloads or 'generated',
+            'deliveries': args.deliveries, 'vehicles': args.vehicles, 'reads': args.reads,
+            'concurrency': args.concurrency, 'rate': args.rate, 'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    for name, result in results.items():
+        latency = result['latency_ms']
+        print(f"{name:>15}: {result['throughput_rps']} req/s  p50 {latency['p50']} ms  "
+              f"p95 {latency['p95']} ms  p99 {latency['p99']} ms  errors {result['errors']}", file=sys.stderr)
+    return 0 if all(result['errors'] == 0 for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,152 +1,420 @@
 import os
 import smartcar
-from flask import Flask, request, redirect, session, render_template, jsonify
+from flask import (
+    Flask, Blueprint, Response, current_app, request, redirect, session, render_template, jsonify,
+    stream_with_context
+)
 from dotenv import load_dotenv
 import hmac
 import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime, timezone
-import json
 
-from models import db, User, Vehicle, WebhookData, UserSession
+from sqlalchemy import select, update
+
+from models import (
+    db, User, Vehicle, WebhookData, UserSession, DEFAULT_USER_ID, PLACEHOLDER_TOKEN, upgrade_schema
+)
+from db_backend import (
+    normalize_database_url, is_sqlite_url, sqlite_engine_options,
+    install_sqlite_pragmas, SQLiteWriter, LeaderLock, dialect_insert
+)
+from token_refresh import TokenRefreshScheduler
+from smartcar_transport import SmartcarTransport, install_transport, configure_base_urls
+from smartcar_rate_limit import SmartcarRateLimiter, background_priority
+from smartcar_circuit import CircuitBreaker
+from vehicle_poller import VehiclePoller, POLL_MODE, VEHICLE_POLLER_PARKED_SECONDS
+from app_logging import get_logger
+import metrics
+import query_log
+import server_timing
+from signals import SIGNAL_EVENT_TYPES, EVENT_TYPES, event_metadata, enhanced_signal_data, describe_signal
+from export_webhooks import FORMATS, export_chunks, parse_time
 
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY')
-if not app.secret_key:
-    raise ValueError("SECRET_KEY env variable not found")
+log = get_logger('main')
 
-database_url = os.getenv('DATABASE_URL')
-if not database_url:
-    raise ValueError("DATABASE_URL env variable not found")
+# routes are registered on the app by create_app()
+bp = Blueprint('main', __name__)
 
-if database_url.startswith('postgres://'):
-    database_url = database_url.replace('postgres://', 'postgresql+pg8000://', 1)
-elif database_url.startswith('postgresql://'):
-    database_url = database_url.replace('postgresql://', 'postgresql+pg8000://', 1)
+# every smartcar SDK call (auth and vehicle API) goes through one pooled session
+smartcar_rate_limiter = SmartcarRateLimiter()
+smartcar_breaker = CircuitBreaker()
+smartcar_transport = install_transport(
+    SmartcarTransport(limiter=smartcar_rate_limiter, breaker=smartcar_breaker)
+)
+smartcar_transport.observers.append(metrics.observe_smartcar_call)
+smartcar_transport.observers.append(server_timing.observe_smartcar_call)
+configure_base_urls()
 
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+# smartcar configuration
+SMARTCAR_SCOPE = ['read_vehicle_info', 'read_location', 'read_odometer', 'read_battery', 'read_charge']
+_client = None
+_client_lock = threading.Lock()
 
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def get_client():
+    """Build the Smartcar AuthClient on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                smartcar_client_id = os.getenv('SMARTCAR_CLIENT_ID')
+                smartcar_client_secret = os.getenv('SMARTCAR_CLIENT_SECRET')
+                smartcar_redirect_uri = os.getenv('SMARTCAR_REDIRECT_URI')
+                
+                if not smartcar_client_id or not smartcar_client_secret or not smartcar_redirect_uri:
+                    raise ValueError("smartcar env variables are required")
+                
+                _client = smartcar.AuthClient(
+                    client_id=smartcar_client_id,
+                    client_secret=smartcar_client_secret,
+                    redirect_uri=smartcar_redirect_uri,
+                    scope=SMARTCAR_SCOPE,
+                    test_mode=False
+                )
+    return _client
+
+#token management
+def get_default_user_id():
+    """Return the default user's primary key, creating the row atomically if needed"""
+    user_pk = db.session.execute(
+        select(User.id).filter_by(smartcar_user_id=DEFAULT_USER_ID)
+    ).scalar()
+    if user_pk is not None:
+        return user_pk
+    
+    # ON CONFLICT DO NOTHING: a concurrent worker may have inserted it first
+    stmt = dialect_insert(User.__table__, db.engine.dialect.name).values(
+        smartcar_user_id=DEFAULT_USER_ID,
+        email='default@example.com'
+    ).on_conflict_do_nothing(index_elements=['smartcar_user_id']).returning(User.id)
+    user_pk = db.session.execute(stmt).scalar()
+    if user_pk is None:
+        user_pk = db.session.execute(
+            select(User.id).filter_by(smartcar_user_id=DEFAULT_USER_ID)
+        ).scalar_one()
+    return user_pk
 
-# initialize database
-db.init_app(app)
+def upsert_vehicle_tokens(vehicle_id, access_token, refresh_token, expiration):
+    """Insert or update a vehicle's tokens in one statement and return its primary key"""
+    stmt = dialect_insert(Vehicle.__table__, db.engine.dialect.name).values(
+        smartcar_vehicle_id=vehicle_id,
+        access_token=access_token,
+        refresh_token=refresh_token,
+        token_expires_at=expiration,
+        user_id=get_default_user_id()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['smartcar_vehicle_id'],
+        set_={
+            'access_token': stmt.excluded.access_token,
+            'refresh_token': stmt.excluded.refresh_token,
+            'token_expires_at': stmt.excluded.token_expires_at,
+            'updated_at': datetime.utcnow()
+        }
+    ).returning(Vehicle.id)
+    return db.session.execute(stmt).scalar_one()
 
-# smartcar configuration
-smartcar_client_id = os.getenv('SMARTCAR_CLIENT_ID')
-smartcar_client_secret = os.getenv('SMARTCAR_CLIENT_SECRET')
-smartcar_redirect_uri = os.getenv('SMARTCAR_REDIRECT_URI')
-
-if not smartcar_client_id or not smartcar_client_secret or not smartcar_redirect_uri:
-    raise ValueError("smartcar env variables are required")
-
-client = smartcar.AuthClient(
-    client_id=smartcar_client_id,
-    client_secret=smartcar_client_secret,
-    redirect_uri=smartcar_redirect_uri,
-    scope=['read_vehicle_info', 'read_location', 'read_odometer', 'read_battery', 'read_charge'],
-    test_mode=False
-)
+def ensure_vehicle_id(vehicle_id):
+    """Return a vehicle's primary key, creating a placeholder row if it is unknown"""
+    vehicle_pk = db.session.execute(
+        select(Vehicle.id).filter_by(smartcar_vehicle_id=vehicle_id)
+    ).scalar()
+    if vehicle_pk is not None:
+        return vehicle_pk
+    
+    log.info("vehicle.placeholder_created", vehicle_id=vehicle_id)
+    stmt = dialect_insert(Vehicle.__table__, db.engine.dialect.name).values(
+        smartcar_vehicle_id=vehicle_id,
+        access_token=PLACEHOLDER_TOKEN,
+        refresh_token=PLACEHOLDER_TOKEN,
+        token_expires_at=datetime.utcnow(),
+        user_id=get_default_user_id()
+    )
+    # no-op update so RETURNING yields the id even if another worker won the insert,
+    # without touching the winner's tokens
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['smartcar_vehicle_id'],
+        set_={'smartcar_vehicle_id': stmt.excluded.smartcar_vehicle_id}
+    ).returning(Vehicle.id)
+    return db.session.execute(stmt).scalar_one()
 
-#token management
 def store_access_token(vehicle_id, access_token_data):
     try:
-        from datetime import datetime, timezone
         # Handle both timestamp and datetime objects
         if isinstance(access_token_data['expiration'], (int, float)):
             expiration = datetime.fromtimestamp(access_token_data['expiration'], tz=timezone.utc)
         else:
             expiration = access_token_data['expiration']
         
-        print(f"Starting store_access_token for vehicle {vehicle_id}")
-        
-        # Check if vehicle exists
-        vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
-        
-        if vehicle:
-            print(f"Found existing vehicle {vehicle_id}, updating tokens")
-            vehicle.access_token = access_token_data['access_token']
-            vehicle.refresh_token = access_token_data['refresh_token']
-            vehicle.token_expires_at = expiration
-            vehicle.updated_at = datetime.utcnow()
-        else:
-            print(f"Vehicle {vehicle_id} not found, creating new vehicle")
-            
-            # Create a default user if none exists
-            user = User.query.first()
-            if not user:
-                print("No users found, creating default user")
-                user = User(
-                    smartcar_user_id='default_user',
-                    email='default@example.com'
-                )
-                db.session.add(user)
-                db.session.commit()
-                print(f"Created default user with ID: {user.id}")
-            else:
-                print(f"Using existing user with ID: {user.id}")
-            
-            # Create new vehicle
-            vehicle = Vehicle(
-                smartcar_vehicle_id=vehicle_id,
-                access_token=access_token_data['access_token'],
-                refresh_token=access_token_data['refresh_token'],
-                token_expires_at=expiration,
-                user_id=user.id
-            )
-            db.session.add(vehicle)
-            print(f"Created new vehicle {vehicle_id} with user_id {user.id}")
+        vehicle_pk = upsert_vehicle_tokens(
+            vehicle_id,
+            access_token_data['access_token'],
+            access_token_data['refresh_token'],
+            expiration
+        )
         
-        print("Committing to database...")
         db.session.commit()
-        print(f"Successfully stored access token for vehicle {vehicle_id}")
+        log.info("token.stored", vehicle_id=vehicle_id, vehicle_pk=vehicle_pk)
         return True
     except Exception as e:
-        print(f"Error storing access token: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("token.store_failed", vehicle_id=vehicle_id)
         db.session.rollback()
         return False
 
 def get_access_token(vehicle_id):
     try:
         vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
-        if vehicle:
-            from datetime import datetime, timezone
-            # Check if token_expires_at is not None before comparison
-            # Make sure both datetimes are timezone-aware for comparison
-            current_time = datetime.now(timezone.utc)
-            if vehicle.token_expires_at:
-                # If token_expires_at is timezone-naive, assume it's UTC
-                if vehicle.token_expires_at.tzinfo is None:
-                    token_expires_utc = vehicle.token_expires_at.replace(tzinfo=timezone.utc)
-                else:
-                    token_expires_utc = vehicle.token_expires_at
-                
-                if token_expires_utc > current_time:
-                    return {
-                        'access_token': vehicle.access_token,
-                        'refresh_token': vehicle.refresh_token,
-                        'expiration': vehicle.token_expires_at.timestamp()
-                    }
-            else:
-                # Token expired, try to refresh
-                return refresh_access_token_db(vehicle.refresh_token, vehicle_id)
-        return None
+        if not vehicle or vehicle.refresh_token == PLACEHOLDER_TOKEN:
+            return None
+        
+        # Make sure both datetimes are timezone-aware for comparison
+        current_time = datetime.now(timezone.utc)
+        token_expires_utc = vehicle.token_expires_at
+        if token_expires_utc and token_expires_utc.tzinfo is None:
+            # If token_expires_at is timezone-naive, assume it's UTC
+            token_expires_utc = token_expires_utc.replace(tzinfo=timezone.utc)
+        
+        if token_expires_utc and token_expires_utc > current_time:
+            return {
+                'access_token': vehicle.access_token,
+                'refresh_token': vehicle.refresh_token,
+                'expiration': token_expires_utc.timestamp()
+            }
+        
+        # Token expired; the background refresher normally gets here first
+        log.info("token.refresh_on_demand", vehicle_id=vehicle_id)
+        return refresh_access_token_db(vehicle.refresh_token, vehicle_id)
     except Exception as e:
-        print(f"Error getting access token: {str(e)}")
+        log.error("token.lookup_failed", vehicle_id=vehicle_id, error=str(e))
+        return None
+
+# single-flight refresh: one lock per refresh token in-process, plus a postgres
+# advisory lock across gunicorn workers. refresh tokens are single-use and an
+# account's token is shared by every vehicle on it, so only the winner may spend
+# one; everyone else reuses the pair it stored on all of those vehicles.
+_refresh_locks = {}  # refresh token -> [lock, holders and waiters]
+_refresh_locks_guard = threading.Lock()
+
+@contextmanager
+def _refresh_lock(refresh_token):
+    """Hold the refresh token's lock; the entry is dropped once nobody holds or waits for it"""
+    with _refresh_locks_guard:
+        entry = _refresh_locks.setdefault(refresh_token, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _refresh_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _refresh_locks[refresh_token]
+
+def _advisory_lock_key(refresh_token):
+    # stable signed 64-bit key (hash() is randomized per process)
+    digest = hashlib.sha256(f"smartcar-token-refresh:{refresh_token}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+def _stored_token(conn, vehicle_id):
+    row = conn.execute(
+        select(Vehicle.access_token, Vehicle.refresh_token, Vehicle.token_expires_at)
+        .filter_by(smartcar_vehicle_id=vehicle_id)
+    ).one_or_none()
+    if row is None:
         return None
+    expires_at = row.token_expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return {
+        'access_token': row.access_token,
+        'refresh_token': row.refresh_token,
+        'expiration': expires_at.timestamp()
+    }
+
+def _save_refreshed_token(conn, refresh_token, access_token_data):
+    """Replace refresh_token with the new pair on every vehicle that shares it; returns the row count"""
+    expiration = access_token_data['expiration']
+    if isinstance(expiration, (int, float)):
+        expiration = datetime.fromtimestamp(expiration, tz=timezone.utc)
+    return conn.execute(
+        update(Vehicle.__table__)
+        .where(Vehicle.__table__.c.refresh_token == refresh_token)
+        .values(
+            access_token=access_token_data['access_token'],
+            refresh_token=access_token_data['refresh_token'],
+            token_expires_at=expiration,
+            updated_at=datetime.utcnow()
+        )
+    ).rowcount
 
 def refresh_access_token_db(refresh_token, vehicle_id):
     try:
-        new_token = client.refresh_token(refresh_token)
-        if new_token:
-            store_access_token(vehicle_id, new_token)
-        return new_token
+        with _refresh_lock(refresh_token):
+            # a transaction of its own: reads what other workers committed and
+            # leaves whatever the caller's session has pending alone
+            with db.engine.begin() as conn:
+                if conn.dialect.name == 'postgresql':
+                    # transaction-scoped: released when this block commits or rolls back
+                    conn.execute(select(db.func.pg_advisory_xact_lock(_advisory_lock_key(refresh_token))))
+                
+                stored = _stored_token(conn, vehicle_id)
+                if stored and stored['refresh_token'] != refresh_token:
+                    # someone else already spent this refresh token; reuse their result
+                    log.info("token.refresh_reused", vehicle_id=vehicle_id)
+                    return stored
+                
+                new_token = get_client().exchange_refresh_token(refresh_token)
+                if new_token:
+                    vehicles = _save_refreshed_token(conn, refresh_token, new_token)
+            if new_token:
+                log.info("token.stored", vehicle_id=vehicle_id, vehicles=vehicles)
+            return new_token
     except Exception as e:
-        print(f"Error refreshing token in database: {str(e)}")
+        log.error("token.refresh_failed", vehicle_id=vehicle_id, error=str(e))
         return None
 
+# bounded pool for live smartcar reads when no webhook data is stored
+LIVE_FETCH_MAX_WORKERS = int(os.getenv('LIVE_FETCH_MAX_WORKERS', '16'))
+LIVE_FETCH_DEADLINE_SECONDS = float(os.getenv('LIVE_FETCH_DEADLINE_SECONDS', '5'))
+live_fetch_pool = ThreadPoolExecutor(max_workers=LIVE_FETCH_MAX_WORKERS, thread_name_prefix='smartcar-live')
+# background jobs that must not hold up a request
+background_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv('BACKGROUND_MAX_WORKERS', '4')),
+    thread_name_prefix='background'
+)
+
+def fetch_live(calls, deadline=None):
+    """Run named zero-argument Smartcar calls in parallel under one overall deadline
+    
+    Returns {name: (result, error)}; calls still running at the deadline report a
+    TimeoutError so the caller can render partial data.
+    """
+    deadline = LIVE_FETCH_DEADLINE_SECONDS if deadline is None else deadline
+    # the calls run on pool threads, so the request is charged the time it waits for them
+    with server_timing.timed('smartcar'):
+        futures = {name: live_fetch_pool.submit(fn) for name, fn in calls.items()}
+        done, _ = wait(futures.values(), timeout=deadline)
+    results = {}
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            results[name] = (None, TimeoutError(f"{name} did not finish within {deadline}s"))
+            continue
+        try:
+            results[name] = (future.result(), None)
+        except Exception as e:
+            results[name] = (None, e)
+    return results
+
+# live reads are stored like webhook signals (mode 'api') so they can be served
+# again, and shown as stale when Smartcar is degraded
+LIVE_SIGNAL_MODE = 'api'
+LIVE_DATA_MAX_AGE_SECONDS = int(os.getenv('LIVE_DATA_MAX_AGE_SECONDS', '300'))
+
+def needs_live_read(entry):
+    """True when nothing is stored, or only an aged copy of an earlier live or polled read"""
+    if entry is None:
+        return True
+    mode = entry.data_dict.get('metadata', {}).get('mode')
+    if mode == POLL_MODE:
+        # the poller stretches its interval while a vehicle is parked
+        max_age = max(LIVE_DATA_MAX_AGE_SECONDS, VEHICLE_POLLER_PARKED_SECONDS)
+    elif mode == LIVE_SIGNAL_MODE:
+        max_age = LIVE_DATA_MAX_AGE_SECONDS
+    else:
+        return False
+    return (datetime.utcnow() - entry.timestamp).total_seconds() > max_age
+
+def stored_signal_source(entry, data, stale=False):
+    """Label for a stored signal on the vehicle page"""
+    mode = data.get('metadata', {}).get('mode')
+    if mode == LIVE_SIGNAL_MODE:
+        source = 'from API'
+    elif mode == POLL_MODE:
+        source = 'from poller'
+    else:
+        source = 'from webhook'
+    if stale:
+        return f"{source}, stale as of {entry.timestamp.isoformat()} UTC"
+    return source
+
+def store_live_signal(vehicle_id, event_type, value):
+    """Persist a live Smartcar read in the background"""
+    data = {'value': value, 'metadata': {'mode': LIVE_SIGNAL_MODE, 'retrieved_at': int(time.time() * 1000)}}
+    background_pool.submit(_store_live_signal, current_app._get_current_object(), vehicle_id, event_type, data)
+
+def _store_live_signal(app, vehicle_id, event_type, data):
+    with app.app_context():
+        run_write(store_webhook_data, vehicle_id, event_type, data, timestamp=datetime.utcnow())
+
+# cached vehicle attributes: served from the vehicles table, refreshed off the request path
+VEHICLE_INFO_TTL_SECONDS = int(os.getenv('VEHICLE_INFO_TTL_SECONDS', str(7 * 24 * 3600)))
+VEHICLE_INFO_RETRY_SECONDS = int(os.getenv('VEHICLE_INFO_RETRY_SECONDS', '300'))
+_attribute_refreshes = {}  # vehicle_id -> monotonic time of the last scheduled refresh
+_attribute_refreshes_lock = threading.Lock()
+
+def vehicle_attributes(db_vehicle):
+    """Return make/model/year from the database, scheduling a background info() refresh if needed"""
+    attributes = {'make': db_vehicle.make, 'model': db_vehicle.model, 'year': db_vehicle.year}
+    missing = any(value is None for value in attributes.values())
+    schedule_attribute_refresh(db_vehicle.smartcar_vehicle_id, missing=missing)
+    return attributes
+
+def schedule_attribute_refresh(vehicle_id, missing=False):
+    now = time.monotonic()
+    with _attribute_refreshes_lock:
+        last = _attribute_refreshes.get(vehicle_id)
+        if last is None and not missing:
+            # attributes are present; start the TTL clock without calling Smartcar
+            _attribute_refreshes[vehicle_id] = now
+            return False
+        if last is not None and now - last < (VEHICLE_INFO_RETRY_SECONDS if missing else VEHICLE_INFO_TTL_SECONDS):
+            return False
+        _attribute_refreshes[vehicle_id] = now
+    background_pool.submit(refresh_vehicle_attributes, current_app._get_current_object(), vehicle_id)
+    return True
+
+def refresh_vehicle_attributes(app, vehicle_id):
+    """Fetch info() from Smartcar and store make/model/year on the vehicle row"""
+    try:
+        with background_priority():
+            # the token is looked up (and refreshed if expired) here, never on the request path
+            with app.app_context():
+                token_data = get_access_token(vehicle_id)
+            if not token_data:
+                log.warning("vehicle.info_refresh_skipped", vehicle_id=vehicle_id, reason="no_token")
+                return None
+            info = smartcar.Vehicle(vehicle_id, token_data['access_token']).info()
+        with app.app_context():
+            run_write(update_vehicle_attributes, vehicle_id, info)
+        log.info("vehicle.info_refreshed", vehicle_id=vehicle_id)
+        return info
+    except Exception as e:
+        log.error("vehicle.info_refresh_failed", vehicle_id=vehicle_id, error=str(e))
+        return None
+
+def update_vehicle_attributes(vehicle_id, info):
+    update_vehicles_attributes({vehicle_id: info})
+
+def update_vehicles_attributes(infos):
+    """Store make/model/year for {vehicle_id: info} in one transaction"""
+    try:
+        for vehicle_id, info in infos.items():
+            db.session.execute(
+                update(Vehicle)
+                .where(Vehicle.smartcar_vehicle_id == vehicle_id)
+                .values(make=info.get('make'), model=info.get('model'), year=info.get('year'), updated_at=datetime.utcnow())
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
 # get user_id from vehicle
 def get_user_id_from_vehicle(vehicle_id):
     vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
@@ -156,48 +424,43 @@ def get_user_id_from_vehicle(vehicle_id):
     return None
 
 
+def run_write(fn, *args, **kwargs):
+    """Run a write on the sqlite writer thread when enabled, inline otherwise"""
+    sqlite_writer = current_app.extensions.get('sqlite_writer')
+    if sqlite_writer is None:
+        return fn(*args, **kwargs)
+    return sqlite_writer.submit(fn, *args, **kwargs).result()
+
+
 # store webhook data
 def store_webhook_data(vehicle_id, event_type, data, raw_data=None, timestamp=None):
     try:
         if timestamp is None:
-            timestamp = datetime.now()
+            # naive UTC on every write path, so latest_for and needs_live_read compare one clock
+            timestamp = datetime.utcnow()
         
-        vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
-        if not vehicle:
-            print(f"Vehicle {vehicle_id} not found in database, creating placeholder vehicle")
-
-            store_access_token(vehicle_id, {
-                'access_token': 'placeholder', 
-                'refresh_token': 'placeholder', 
-                'expiration': datetime.now().timestamp()
-            })
-            
-            vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
-            if not vehicle:
-                print(f"Could not find vehicle {vehicle_id} after attempting to create placeholder")
-                return False
-            print(f"Created placeholder vehicle {vehicle_id}")
+        vehicle_pk = ensure_vehicle_id(vehicle_id)
         
         webhook_entry = WebhookData(
-            vehicle_id=vehicle.id,
+            vehicle_id=vehicle_pk,
             event_type=event_type,
             timestamp=timestamp,
-            data=json.dumps(data),
-            raw_data=json.dumps(raw_data) if raw_data else None
+            data=server_timing.json_dumps(data),
+            raw_data=server_timing.json_dumps(raw_data) if raw_data else None
         )
         
         db.session.add(webhook_entry)
         db.session.commit()
-        print(f"Stored webhook data for vehicle {vehicle_id}, event {event_type}")
+        log.debug("signal.stored", vehicle_id=vehicle_id, event_type=event_type)
         return True
     except Exception as e:
-        print(f"Error storing webhook data: {str(e)}")
+        log.error("signal.store_failed", vehicle_id=vehicle_id, event_type=event_type, error=str(e))
         db.session.rollback()
         return False
 
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     content = """
     <h2>Smartcar Server</h2>
@@ -226,14 +489,78 @@ def index():
     """
     return render_template('base.html', content=content)
 
-@app.route('/login')
+@bp.route('/login')
 def login():
     # Generate auth URL without requiring user_id
-    auth_url = client.get_auth_url()
+    auth_url = get_client().get_auth_url()
     return redirect(auth_url)
 
 
-@app.route('/exchange')
+# connecting every vehicle on an account from the OAuth callback
+SMARTCAR_VEHICLE_PAGE_SIZE = int(os.getenv('SMARTCAR_VEHICLE_PAGE_SIZE', '50'))
+EXCHANGE_INFO_MAX_WORKERS = int(os.getenv('EXCHANGE_INFO_MAX_WORKERS', '8'))
+
+def list_vehicle_ids(access_token):
+    """Return every vehicle id on the account, following Smartcar's paging"""
+    vehicle_ids = []
+    while True:
+        page = smartcar.get_vehicle_ids(access_token, limit=SMARTCAR_VEHICLE_PAGE_SIZE, offset=len(vehicle_ids))
+        vehicles = page.get('vehicles', [])
+        vehicle_ids.extend(vehicles)
+        total = page.get('paging', {}).get('count', len(vehicle_ids))
+        if not vehicles or len(vehicle_ids) >= total:
+            return vehicle_ids
+
+def register_vehicles(vehicle_ids, access_token_data):
+    """Store the account's token on every vehicle in one transaction"""
+    expiration = access_token_data['expiration']
+    if isinstance(expiration, (int, float)):
+        expiration = datetime.fromtimestamp(expiration, tz=timezone.utc)
+    try:
+        for vehicle_id in vehicle_ids:
+            upsert_vehicle_tokens(
+                vehicle_id,
+                access_token_data['access_token'],
+                access_token_data['refresh_token'],
+                expiration
+            )
+        db.session.commit()
+        log.info("exchange.vehicles_registered", count=len(vehicle_ids))
+    except Exception:
+        db.session.rollback()
+        raise
+    # info() is fetched right below; keep /vehicle from scheduling its own refresh
+    now = time.monotonic()
+    with _attribute_refreshes_lock:
+        for vehicle_id in vehicle_ids:
+            _attribute_refreshes[vehicle_id] = now
+
+def fetch_connected_vehicle_info(app, vehicle_ids, access_token):
+    """Fetch info() for newly connected vehicles on a bounded pool and store it in one transaction"""
+    def fetch(vehicle_id):
+        with background_priority():
+            return smartcar.Vehicle(vehicle_id, access_token).info()
+    
+    infos = {}
+    with ThreadPoolExecutor(max_workers=EXCHANGE_INFO_MAX_WORKERS, thread_name_prefix='exchange-info') as pool:
+        futures = {pool.submit(fetch, vehicle_id): vehicle_id for vehicle_id in vehicle_ids}
+        for future, vehicle_id in futures.items():
+            try:
+                infos[vehicle_id] = future.result()
+            except Exception as e:
+                log.error("exchange.info_failed", vehicle_id=vehicle_id, error=str(e))
+    if not infos:
+        return 0
+    try:
+        with app.app_context():
+            run_write(update_vehicles_attributes, infos)
+        log.info("exchange.info_stored", stored=len(infos), vehicles=len(vehicle_ids))
+        return len(infos)
+    except Exception as e:
+        log.error("exchange.info_store_failed", error=str(e))
+        return 0
+
+@bp.route('/exchange')
 def exchange():
     code = request.args.get('code')
     
@@ -242,37 +569,24 @@ def exchange():
         return render_template('base.html', content=content)
     
     try:
-        access_token = client.exchange_code(code)
-        
-        print(f"Received access token: {access_token}")
+        access_token = get_client().exchange_code(code)
         
         # Store in database only - no session storage
-        print(f"Storing token in database")
-        
         try:
-            vehicle_ids = smartcar.get_vehicle_ids(access_token['access_token'])
-            if vehicle_ids['vehicles']:
-                vehicle_id = vehicle_ids['vehicles'][0]
-                
-                vehicle = smartcar.Vehicle(vehicle_id, access_token['access_token'])
-                vehicle_info = vehicle.info()
-                
-                store_access_token(vehicle_id, access_token)
-                
-                db_vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
-                if db_vehicle:
-                    db_vehicle.make = vehicle_info.get('make')
-                    db_vehicle.model = vehicle_info.get('model')
-                    db_vehicle.year = vehicle_info.get('year')
-                    db.session.commit()
-                    print(f"Updated vehicle info for {vehicle_id}")
-                else:
-                    print(f"Warning: Vehicle {vehicle_id} not found in database after storing token")
+            vehicle_ids = list_vehicle_ids(access_token['access_token'])
+            if vehicle_ids:
+                register_vehicles(vehicle_ids, access_token)
+                # make/model/year arrive in the background so the callback returns right away
+                background_pool.submit(
+                    fetch_connected_vehicle_info, current_app._get_current_object(), vehicle_ids, access_token['access_token']
+                )
+                vehicle_id = vehicle_ids[0]
             else:
-                print(f"Warning: No vehicles found")
+                log.warning("exchange.no_vehicles")
                 vehicle_id = None
         except Exception as e:
-            print(f"Error storing vehicle info in database: {str(e)}")
+            log.error("exchange.register_failed", error=str(e))
+            vehicle_ids = []
             vehicle_id = None
         
         # No user_id to persist
@@ -281,6 +595,7 @@ def exchange():
             'status': 'success',
             'message': 'Vehicle connected successfully',
             'vehicle_id': vehicle_id if 'vehicle_id' in locals() else None,
+            'vehicle_ids': vehicle_ids,
             'access_token': access_token['access_token'] if 'access_token' in locals() else None
         })
     
@@ -290,7 +605,7 @@ def exchange():
             'message': f'Error exchanging code: {str(e)}'
         }), 400
 
-@app.route('/vehicle')
+@bp.route('/vehicle')
 def vehicle():
     try:
         # Get vehicle_id from query parameter
@@ -308,11 +623,10 @@ def vehicle():
             return render_template('base.html', content=content)
         
         # Find vehicle directly by vehicle_id
-        print(f"Looking for vehicle with ID: {vehicle_id}")
         db_vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
         
         if not db_vehicle:
-            print(f"Vehicle {vehicle_id} not found in database")
+            log.info("vehicle.not_found", vehicle_id=vehicle_id)
             content = f'''
             <div class="error">
                 <h3>Vehicle Not Found</h3>
@@ -322,20 +636,13 @@ def vehicle():
             '''
             return render_template('base.html', content=content)
         
-        print(f"Found vehicle in database: {db_vehicle.smartcar_vehicle_id}")
-        
-        print(f"Found vehicle: {vehicle_id} ({db_vehicle.make} {db_vehicle.model} {db_vehicle.year})")
-        
         token_data = get_access_token(vehicle_id)
         access_token = None
         if token_data:
             access_token = token_data['access_token']
-            print(f"Using database token for vehicle {vehicle_id}")
-        else:
-            print(f"No valid access token found for vehicle {vehicle_id}")
         
         if not access_token:
-            print(f"No access token available for vehicle {vehicle_id}")
+            log.info("vehicle.no_token", vehicle_id=vehicle_id)
             content = '''
             <div class="error">
                 <h3>No Vehicle Connected</h3>
@@ -345,8 +652,6 @@ def vehicle():
             '''
             return render_template('base.html', content=content)
         
-        print(f"Session keys: {list(session.keys())}")
-        
         if not access_token or not vehicle_id:
             content = '''
             <div class="error">
@@ -357,24 +662,35 @@ def vehicle():
             '''
             return render_template('base.html', content=content)
         
-        print(f"Using access token: {access_token}")
-        print(f"Using vehicle ID: {vehicle_id}")
-        
         vehicle = smartcar.Vehicle(vehicle_id, access_token)
         
-        print("Getting vehicle info...")
-        info = vehicle.info()
-        print(f"Vehicle info: {info}")
+        latest_location_entry = db_vehicle.latest_signal('Location.PreciseLocation')
+        latest_odometer_entry = db_vehicle.latest_signal('Odometer.TraveledDistance')
+        
+        # Live reads run in parallel; the page waits for the slowest, not the sum.
+        # While the circuit is open these fail immediately and stored data is shown as stale.
+        live_calls = {}
+        if needs_live_read(latest_location_entry):
+            live_calls['location'] = vehicle.location
+        if needs_live_read(latest_odometer_entry):
+            live_calls['odometer'] = vehicle.odometer
+        live = fetch_live(live_calls)
+        
+        # make/model/year come from the database; refreshed in the background when missing or stale
+        info = {key: value if value is not None else 'N/A'
+                for key, value in vehicle_attributes(db_vehicle).items()}
         
         # --- Location ---
-        # Get latest location from database
-        latest_location_entry = WebhookData.query.filter_by(
-            vehicle_id=db_vehicle.id,
-            event_type='Location.PreciseLocation'
-        ).order_by(WebhookData.timestamp.desc()).first()
-        
-        if latest_location_entry:
-            location_data = latest_location_entry.to_dict()['data']
+        location, location_error = live.get('location', (None, None))
+        if location_error:
+            log.warning("vehicle.live_read_failed", vehicle_id=vehicle_id, signal="location", error=str(location_error))
+        if location:
+            location_value = location.get('data', {})
+            store_live_signal(vehicle_id, 'Location.PreciseLocation', location_value)
+            location_info = f"<p><strong>Location:</strong> {location_value.get('latitude', 'N/A')}, {location_value.get('longitude', 'N/A')} (from API)</p>"
+        elif latest_location_entry:
+            location_data = latest_location_entry.data_dict
+            source = stored_signal_source(latest_location_entry, location_data, stale=bool(location_error))
             # Handle both old and new data structures
             if 'value' in location_data:
                 # New enhanced structure
@@ -384,80 +700,63 @@ def vehicle():
                 direction = location_value.get('direction', 'N/A')
                 heading = location_value.get('heading', 'N/A')
                 location_type = location_value.get('locationType', 'N/A')
-                location_info = f"<p><strong>Location:</strong> {lat}, {lng} (Direction: {direction}, Heading: {heading}, Type: {location_type}) (from webhook)</p>"
+                location_info = f"<p><strong>Location:</strong> {lat}, {lng} (Direction: {direction}, Heading: {heading}, Type: {location_type}) ({source})</p>"
             else:
                 # Old structure
                 lat = location_data.get('latitude', 'N/A')
                 lng = location_data.get('longitude', 'N/A')
-                location_info = f"<p><strong>Location:</strong> {lat}, {lng} (from webhook)</p>"
+                location_info = f"<p><strong>Location:</strong> {lat}, {lng} ({source})</p>"
         else:
-            try:
-                print("Getting vehicle location...")
-                location = vehicle.location()
-                print(f"Location response: {location}")
-                location_info = f"<p><strong>Location:</strong> {location.get('data', {}).get('latitude', 'N/A')}, {location.get('data', {}).get('longitude', 'N/A')} (from API)</p>"
-            except Exception as e:
-                print(f"Error getting location: {str(e)}")
-                location_info = "<p><strong>Location:</strong> Error retrieving location</p>"
+            location_info = "<p><strong>Location:</strong> Error retrieving location</p>"
         
         # --- Odometer ---
-        # Get latest odometer from database
-        latest_odometer_entry = WebhookData.query.filter_by(
-            vehicle_id=db_vehicle.id,
-            event_type='Odometer.TraveledDistance'
-        ).order_by(WebhookData.timestamp.desc()).first()
-        
-        if latest_odometer_entry:
-            odometer_data = latest_odometer_entry.to_dict()['data']
+        odometer, odometer_error = live.get('odometer', (None, None))
+        if odometer_error:
+            log.warning("vehicle.live_read_failed", vehicle_id=vehicle_id, signal="odometer", error=str(odometer_error))
+        if odometer:
+            odometer_value = odometer.get('data', {})
+            distance = odometer_value.get('distance', odometer_value.get('value', 'N/A'))
+            store_live_signal(vehicle_id, 'Odometer.TraveledDistance', {'value': distance})
+            odometer_info = f"<p><strong>Odometer:</strong> {distance} km (from API)</p>"
+        elif latest_odometer_entry:
+            odometer_data = latest_odometer_entry.data_dict
+            source = stored_signal_source(latest_odometer_entry, odometer_data, stale=bool(odometer_error))
             # Handle both old and new data structures
             if 'value' in odometer_data:
                 # New enhanced structure
                 odometer_value = odometer_data['value']
                 distance = odometer_value.get('value', 'N/A')
-                odometer_info = f"<p><strong>Odometer:</strong> {distance} km (from webhook)</p>"
+                odometer_info = f"<p><strong>Odometer:</strong> {distance} km ({source})</p>"
             else:
                 # Old structure
                 distance = odometer_data.get('distance', odometer_data.get('value', 'N/A'))
-                odometer_info = f"<p><strong>Odometer:</strong> {distance} km (from webhook)</p>"
+                odometer_info = f"<p><strong>Odometer:</strong> {distance} km ({source})</p>"
         else:
-            try:
-                print("Getting vehicle odometer...")
-                odometer = vehicle.odometer()
-                print(f"Odometer response: {odometer}")
-                odometer_info = f"<p><strong>Odometer:</strong> {odometer.get('data', {}).get('distance', odometer.get('data', {}).get('value', 'N/A'))} km (from API)</p>"
-            except Exception as e:
-                print(f"Error getting odometer: {str(e)}")
-                odometer_info = "<p><strong>Odometer:</strong> Error retrieving odometer</p>"
+            odometer_info = "<p><strong>Odometer:</strong> Error retrieving odometer</p>"
         
 
-        latest_battery_entry = WebhookData.query.filter_by(
-            vehicle_id=db_vehicle.id,
-            event_type='TractionBattery.StateOfCharge'
-        ).order_by(WebhookData.timestamp.desc()).first()
+        latest_battery_entry = db_vehicle.latest_signal('TractionBattery.StateOfCharge')
         
         if latest_battery_entry:
-            soc_data = latest_battery_entry.to_dict()['data']
+            soc_data = latest_battery_entry.data_dict
             # Handle both old and new data structures
             if 'value' in soc_data:
                 # New enhanced structure
                 soc_value_data = soc_data['value']
                 soc_value = soc_value_data.get('value', 'N/A')
-                soc_info = f"<p><strong>State of Charge:</strong> {soc_value}% (from webhook)</p>"
+                soc_info = f"<p><strong>State of Charge:</strong> {soc_value}% ({stored_signal_source(latest_battery_entry, soc_data)})</p>"
             else:
                 # Old structure
                 soc_value = soc_data.get('percentage', soc_data.get('value', 'N/A'))
-                soc_info = f"<p><strong>State of Charge:</strong> {soc_value}% (from webhook)</p>"
+                soc_info = f"<p><strong>State of Charge:</strong> {soc_value}% ({stored_signal_source(latest_battery_entry, soc_data)})</p>"
         else:
             soc_info = "<p><strong>State of Charge:</strong> N/A</p>"
         
 
-        latest_capacity_entry = WebhookData.query.filter_by(
-            vehicle_id=db_vehicle.id,
-            event_type='TractionBattery.NominalCapacity'
-        ).order_by(WebhookData.timestamp.desc()).first()
+        latest_capacity_entry = db_vehicle.latest_signal('TractionBattery.NominalCapacity')
         
         if latest_capacity_entry:
-            capacity_data = latest_capacity_entry.to_dict()['data']
+            capacity_data = latest_capacity_entry.data_dict
             # Handle both old and new data structures
             if 'value' in capacity_data:
                 # New enhanced structure
@@ -471,13 +770,10 @@ def vehicle():
         else:
             capacity_info = "<p><strong>Nominal Capacity:</strong> N/A</p>"
 
-        latest_charge_limits_entry = WebhookData.query.filter_by(
-            vehicle_id=db_vehicle.id,
-            event_type='Charge.ChargeLimits'
-        ).order_by(WebhookData.timestamp.desc()).first()
+        latest_charge_limits_entry = db_vehicle.latest_signal('Charge.ChargeLimits')
         
         if latest_charge_limits_entry:
-            charge_limits_data = latest_charge_limits_entry.to_dict()['data']
+            charge_limits_data = latest_charge_limits_entry.data_dict
             # Handle both old and new data structures
             if 'value' in charge_limits_data:
                 # New enhanced structure
@@ -527,9 +823,7 @@ def vehicle():
         return render_template('base.html', content=content)
         
     except Exception as e:
-        print(f"Error in vehicle route: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("vehicle.page_failed")
         content = f'''
         <div class="error">
             <h3>Unexpected Error</h3>
@@ -540,11 +834,74 @@ def vehicle():
         '''
         return render_template('base.html', content=content)
 
-@app.route('/webhook', methods=['POST'])
+def ingest_vehicle_state(data, source='webhook'):
+    """Store every signal from a VEHICLE_STATE payload (delivered by a webhook or built by the poller)"""
+    # Extract event metadata
+    metadata = event_metadata(data)
+    signal_count = data.get("meta", {}).get("signalCount")
+    
+    # Extract vehicle info
+    vehicle_info = data["data"]["vehicle"]
+    vehicle_id = vehicle_info["id"]
+    signals = data["data"]["signals"]
+    
+    # Update vehicle info if it exists, or create placeholder
+    vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
+    if vehicle:
+        # Update existing vehicle with info from webhook (polled payloads carry only the id)
+        if source == 'webhook':
+            vehicle.make = vehicle_info.get("make")
+            vehicle.model = vehicle_info.get("model")
+            vehicle.year = vehicle_info.get("year")
+            vehicle.last_webhook_at = datetime.utcnow()
+        vehicle.updated_at = datetime.utcnow()
+        db.session.commit()
+    else:
+        ensure_vehicle_id(vehicle_id)
+        update_vehicle_attributes(vehicle_id, vehicle_info)
+        if source == 'webhook':
+            db.session.execute(
+                update(Vehicle).where(Vehicle.smartcar_vehicle_id == vehicle_id).values(last_webhook_at=datetime.utcnow())
+            )
+            db.session.commit()
+    
+    # all sources are stamped with the same UTC clock so their age can be checked
+    timestamp = datetime.utcnow()
+    
+    stored = 0
+    for signal in signals:
+        signal_code = signal.get("code", "")
+        event_type = SIGNAL_EVENT_TYPES.get(signal_code)
+        if event_type is None:
+            metrics.count_signal(signal_code, 'unknown', source)
+            log.warning("ingest.unknown_signal", signal_code=signal_code, vehicle_id=vehicle_id)
+            continue
+        
+        # Create enhanced data structure with metadata
+        enhanced_data = enhanced_signal_data(signal, metadata)
+        if store_webhook_data(vehicle_id, event_type, enhanced_data, raw_data=data, timestamp=timestamp):
+            stored += 1
+            metrics.count_signal(signal_code, 'stored', source)
+        else:
+            metrics.count_signal(signal_code, 'failed', source)
+        log.debug(
+            "ingest.signal", vehicle_id=vehicle_id, event_type=event_type,
+            value=describe_signal(signal_code, signal.get('body', {}))
+        )
+    
+    log.info(
+        "ingest.processed", source=source, event_id=metadata['event_id'], webhook_id=metadata['webhook_id'],
+        vehicle_id=vehicle_id, signal_count=signal_count, stored=stored, new_vehicle=vehicle is None,
+        mode=metadata['mode']
+    )
+    return stored
+
+
+@bp.route('/webhook', methods=['POST'])
 def webhook():
     try:
         data = request.get_json()
-        print(f"Received webhook data: {data}")
+        log.payload("webhook.payload", data)
 
         # Check for verification request first
         if data.get('eventName') == 'verify':
@@ -552,108 +909,15 @@ def webhook():
 
         # Handle VEHICLE_STATE format with signals array
         if data.get("eventType") == "VEHICLE_STATE" and "data" in data and "signals" in data["data"]:
-            # Extract event metadata
-            event_id = data.get("eventId")
-            webhook_id = data.get("meta", {}).get("webhookId")
-            delivery_id = data.get("meta", {}).get("deliveryId")
-            delivered_at = data.get("meta", {}).get("deliveredAt")
-            mode = data.get("meta", {}).get("mode")
-            signal_count = data.get("meta", {}).get("signalCount")
-            
-            # Extract user and vehicle info
-            user_info = data["data"].get("user", {})
-            user_id_from_webhook = user_info.get("id")
-            vehicle_info = data["data"]["vehicle"]
-            vehicle_id = vehicle_info["id"]
-            signals = data["data"]["signals"]
-            
-            print(f"Processing VEHICLE_STATE payload:")
-            print(f"  Event ID: {event_id}")
-            print(f"  Webhook ID: {webhook_id}")
-            print(f"  User ID: {user_id_from_webhook}")
-            print(f"  Vehicle ID: {vehicle_id}")
-            print(f"  Signal Count: {signal_count}")
-            print(f"  Mode: {mode}")
-            
-            # Update vehicle info if it exists, or create placeholder
-            vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
-            user_id = None
-            if vehicle:
-                # Update existing vehicle with info from webhook
-                vehicle.make = vehicle_info.get("make")
-                vehicle.model = vehicle_info.get("model")
-                vehicle.year = vehicle_info.get("year")
-                vehicle.updated_at = datetime.utcnow()
-                db.session.commit()
-                print(f"Updated vehicle info for {vehicle_id}")
-                
-                # Get user_id from the vehicle using helper function
-                user_id = get_user_id_from_vehicle(vehicle_id)
-                print(f"Found existing vehicle with user_id: {user_id}")
-            else:
-                # Use user_id from webhook if available, otherwise default
-                user_id = user_id_from_webhook if user_id_from_webhook else 'default_user'
-                print(f"Creating new vehicle with user_id: {user_id}")
-            
-            for signal in signals:
-                signal_code = signal.get("code", "")
-                signal_name = signal.get("name", "")
-                signal_group = signal.get("group", "")
-                signal_body = signal.get("body", {})
-                signal_meta = signal.get("meta", {})
-                
-                # Extract timing information from signal metadata
-                oem_updated_at = signal_meta.get("oemUpdatedAt")
-                retrieved_at = signal_meta.get("retrievedAt")
-                
-                # Create enhanced data structure with metadata
-                enhanced_data = {
-                    "value": signal_body,
-                    "metadata": {
-                        "signal_name": signal_name,
-                        "signal_group": signal_group,
-                        "oem_updated_at": oem_updated_at,
-                        "retrieved_at": retrieved_at,
-                        "event_id": event_id,
-                        "webhook_id": webhook_id,
-                        "delivery_id": delivery_id,
-                        "delivered_at": delivered_at,
-                        "mode": mode
-                    }
-                }
-                
-                # Map signal codes to event types
-                if signal_code == "location-preciselocation":
-                    store_webhook_data(vehicle_id, "Location.PreciseLocation", enhanced_data, raw_data=data)
-                    print(f"Stored Location.PreciseLocation for vehicle {vehicle_id} (lat: {signal_body.get('latitude')}, lng: {signal_body.get('longitude')})")
-                    
-                elif signal_code == "odometer-traveleddistance":
-                    store_webhook_data(vehicle_id, "Odometer.TraveledDistance", enhanced_data, raw_data=data)
-                    print(f"Stored Odometer.TraveledDistance for vehicle {vehicle_id} (value: {signal_body.get('value')})")
-                    
-                elif signal_code == "tractionbattery-stateofcharge":
-                    store_webhook_data(vehicle_id, "TractionBattery.StateOfCharge", enhanced_data, raw_data=data)
-                    print(f"Stored TractionBattery.StateOfCharge for vehicle {vehicle_id} (value: {signal_body.get('value')}%)")
-                    
-                elif signal_code == "tractionbattery-nominalcapacity":
-                    store_webhook_data(vehicle_id, "TractionBattery.NominalCapacity", enhanced_data, raw_data=data)
-                    print(f"Stored TractionBattery.NominalCapacity for vehicle {vehicle_id} (capacity: {signal_body.get('capacity')} kWh)")
-                    
-                elif signal_code == "charge-chargelimits":
-                    store_webhook_data(vehicle_id, "Charge.ChargeLimits", enhanced_data, raw_data=data)
-                    active_limit = signal_body.get('values', {}).get('activeLimit')
-                    print(f"Stored Charge.ChargeLimits for vehicle {vehicle_id} (active limit: {active_limit}%)")
-                else:
-                    print(f"Unknown signal code: {signal_code} for vehicle {vehicle_id}")
-            
+            run_write(ingest_vehicle_state, data)
             return {'status': 'success', 'message': 'VEHICLE_STATE payload processed'}, 200
         
         # If we reach here, the payload format is not supported
-        print(f"Unsupported webhook payload format: {data}")
+        log.warning("webhook.unsupported", event_type=data.get("eventType"), event_name=data.get("eventName"))
         return {'status': 'error', 'message': 'Unsupported webhook payload format'}, 400
         
     except Exception as e:
-        print(f"Error processing webhook: {str(e)}")
+        log.exception("webhook.failed")
         return {'status': 'error', 'message': str(e)}, 500
 
 def handle_verification(data):
@@ -675,7 +939,7 @@ def handle_verification(data):
             hashlib.sha256
         ).hexdigest()
         
-        print(f"Generated HMAC: {hmac_hash}")
+        log.info("webhook.verified", webhook_id=webhook_id)
         
         return {'challenge': hmac_hash}, 200
         
@@ -684,7 +948,7 @@ def handle_verification(data):
 
 
 # api endpoints
-@app.route('/api/vehicle/<vehicle_id>/access-token')
+@bp.route('/api/vehicle/<vehicle_id>/access-token')
 def get_vehicle_access_token(vehicle_id):
     """Get access token for a specific vehicle"""
     try:
@@ -702,7 +966,21 @@ def get_vehicle_access_token(vehicle_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/vehicle/<vehicle_id>/latest-signals')
+@bp.route('/api/vehicle/<vehicle_id>/info')
+def get_vehicle_info(vehicle_id):
+    """Get cached make/model/year for a specific vehicle"""
+    try:
+        vehicle = Vehicle.query.filter_by(smartcar_vehicle_id=vehicle_id).first()
+        
+        if not vehicle:
+            return jsonify({'error': 'Vehicle not found'}), 404
+        
+        return jsonify(dict(vehicle_attributes(vehicle), vehicle_id=vehicle_id))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/vehicle/<vehicle_id>/latest-signals')
 def get_vehicle_latest_signals(vehicle_id):
     """Get latest signals for a specific vehicle"""
     try:
@@ -711,26 +989,15 @@ def get_vehicle_latest_signals(vehicle_id):
         if not vehicle:
             return jsonify({'error': 'Vehicle not found'}), 404
         
-        event_types = [
-            'Location.PreciseLocation',
-            'Odometer.TraveledDistance',
-            'TractionBattery.StateOfCharge',
-            'TractionBattery.NominalCapacity',
-            'Charge.ChargeLimits'
-        ]
-
         latest_signals = {}
 
-        for event_type in event_types:
-            latest_entry = WebhookData.query.filter_by(
-                vehicle_id=vehicle.id,
-                event_type=event_type
-            ).order_by(WebhookData.timestamp.desc()).first()
+        for event_type in EVENT_TYPES:
+            latest_entry = vehicle.latest_signal(event_type)
             
             if latest_entry:
                 latest_signals[event_type] = {
                     'timestamp': latest_entry.timestamp,
-                    'data': latest_entry.to_dict()['data']
+                    'data': latest_entry.data_dict
                 }
             else:
                 latest_signals[event_type] = None
@@ -743,40 +1010,73 @@ def get_vehicle_latest_signals(vehicle_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/migrate-db', methods=['POST'])
+@bp.route('/api/export')
+def export_signal_history():
+    """Stream stored signals as NDJSON or CSV, filtered by vehicle, event type and time range"""
+    fmt = request.args.get('format', 'ndjson')
+    vehicle_id = request.args.get('vehicle_id')
+    event_types = [
+        event_type for value in request.args.getlist('event_type')
+        for event_type in value.split(',') if event_type
+    ]
+    try:
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+    unknown = set(event_types) - set(EVENT_TYPES)
+    if unknown:
+        return jsonify({'error': f"unknown event_type {', '.join(sorted(unknown))}"}), 400
+    if vehicle_id and not db.session.execute(
+        select(Vehicle.id).filter_by(smartcar_vehicle_id=vehicle_id)
+    ).scalar():
+        return jsonify({'error': 'Vehicle not found'}), 404
+    # the export streams on its own connection; don't hold the session's for the whole download
+    db.session.close()
+    
+    chunks = export_chunks(
+        db.engine, fmt, include_raw=request.args.get('include_raw', 'false').lower() == 'true',
+        vehicle_id=vehicle_id, event_types=event_types, start=start, end=end
+    )
+    filename = f"signals-{vehicle_id or 'all'}.{'csv' if fmt == 'csv' else 'ndjson'}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@bp.route('/migrate-db', methods=['POST'])
 def migrate_database():
     """Migrate database schema (add app_user_id column if missing)"""
     try:
-        from sqlalchemy import text
+        from sqlalchemy import text, inspect
+        
+        # Use the inspector rather than information_schema so this works on sqlite too
+        columns = {c['name'] for c in inspect(db.engine).get_columns('users')}
+        exists = 'app_user_id' in columns
         
-        # Ensure app_user_id column exists on users
-        result = db.session.execute(text("""
-            SELECT 1 FROM information_schema.columns 
-            WHERE table_name = 'users' AND column_name = 'app_user_id'
-        """))
-        exists = result.scalar() is not None
+        # token refresh index and poller coverage column, also applied by init_db.py
+        for change in upgrade_schema(db.engine):
+            log.info("migrate.applied", change=change)
         
         if not exists:
-            print("Adding app_user_id column to users table...")
+            log.info("migrate.add_column", table="users", column="app_user_id", dialect=db.engine.dialect.name)
             db.session.execute(text("ALTER TABLE users ADD COLUMN app_user_id VARCHAR(255)"))
             # Optional unique index for app_user_id
-            try:
-                db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_app_user_id ON users(app_user_id)"))
-            except Exception:
-                pass
+            db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_app_user_id ON users(app_user_id)"))
             db.session.commit()
-            print("app_user_id column added.")
             
             # Backfill app_user_id if missing by copying existing smartcar_user_id
-            users = User.query.all()
-            updated = 0
-            for u in users:
-                if not getattr(u, 'app_user_id', None) and getattr(u, 'smartcar_user_id', None):
-                    u.app_user_id = u.smartcar_user_id
-                    updated += 1
+            result = db.session.execute(text(
+                "UPDATE users SET app_user_id = smartcar_user_id "
+                "WHERE app_user_id IS NULL AND smartcar_user_id IS NOT NULL"
+            ))
+            updated = result.rowcount or 0
+            db.session.commit()
             if updated:
-                db.session.commit()
-                print(f"Backfilled app_user_id for {updated} existing users")
+                log.info("migrate.backfilled", column="app_user_id", rows=updated)
             
             return {'status': 'success', 'message': f'app_user_id column added and {updated} users backfilled'}, 200
         else:
@@ -786,7 +1086,7 @@ def migrate_database():
         db.session.rollback()
         return {'status': 'error', 'message': str(e)}, 500
 
-@app.route('/clear-all-data', methods=['POST'])
+@bp.route('/clear-all-data', methods=['POST'])
 def clear_all_data():
     """Clear all data from database (users, vehicles, webhooks, sessions)"""
     try:
@@ -816,23 +1116,33 @@ def clear_all_data():
         db.session.rollback()
         return {'status': 'error', 'message': str(e)}, 500
 
-@app.route('/debug/database')
+@bp.route('/debug/database')
 def debug_database():
     """Debug endpoint to see what's in the database"""
     try:
         users = User.query.all()
         vehicles = Vehicle.query.all()
-        webhooks = WebhookData.query.all()
+        webhook_count = db.session.execute(select(db.func.count(WebhookData.id))).scalar()
         
         return jsonify({
             'users': [{'id': u.id, 'smartcar_user_id': u.smartcar_user_id, 'email': u.email} for u in users],
             'vehicles': [{'id': v.id, 'smartcar_vehicle_id': v.smartcar_vehicle_id, 'user_id': v.user_id, 'make': v.make, 'model': v.model} for v in vehicles],
-            'webhooks': len(webhooks)
+            'webhooks': webhook_count
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/clear-webhook-data', methods=['POST'])
+@bp.route('/debug/smartcar')
+def debug_smartcar():
+    """Debug endpoint with per-endpoint Smartcar call latency and rate budget usage"""
+    return jsonify({
+        'endpoints': smartcar_transport.stats(),
+        'rate_limit': smartcar_rate_limiter.stats(),
+        'circuit': smartcar_breaker.stats(),
+        'poller': current_app.extensions['vehicle_poller'].stats()
+    })
+
+@bp.route('/clear-webhook-data', methods=['POST'])
 def clear_webhook_data():
     try:
         # clear all webhook data from database
@@ -842,3 +1152,127 @@ def clear_webhook_data():
     except Exception as e:
         db.session.rollback()
         return {'status': 'error', 'message': str(e)}, 500
+
+
+def ingest_polled_state(payload):
+    return run_write(ingest_vehicle_state, payload, source='poll')
+
+
+def create_app(config=None):
+    """Build the Flask app; config overrides settings read from the environment"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
+    
+    if not app.config['SECRET_KEY']:
+        raise ValueError("SECRET_KEY env variable not found")
+    if not app.config['SQLALCHEMY_DATABASE_URI']:
+        raise ValueError("DATABASE_URL env variable not found")
+    
+    database_url = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    if is_sqlite_url(database_url):
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', sqlite_engine_options())
+    
+    # initialize database; the engine opens its first connection on first use
+    db.init_app(app)
+    with app.app_context():
+        metrics.instrument_engine(db.engine)
+        query_log.instrument_engine(db.engine)
+        server_timing.instrument_engine(db.engine)
+    metrics.init_app(app)
+    query_log.init_app(app)
+    server_timing.init_app(app)
+    
+    # embedded sqlite mode: WAL pragmas and a single writer thread for ingest
+    if is_sqlite_url(database_url):
+        with app.app_context():
+            install_sqlite_pragmas(db.engine)
+        app.extensions['sqlite_writer'] = SQLiteWriter(app)
+    
+    # background services are built here but only started by start_background_services()
+    app.extensions['token_refresh_scheduler'] = TokenRefreshScheduler(
+        app, refresh_access_token_db, placeholder_token=PLACEHOLDER_TOKEN
+    )
+    app.extensions['vehicle_poller'] = VehiclePoller(
+        app, get_access_token, ingest_polled_state, placeholder_token=PLACEHOLDER_TOKEN
+    )
+    
+    app.register_blueprint(bp)
+    return app
+
+# background services run in one process; the others keep trying so one takes over if it exits
+BACKGROUND_LEADER_CHECK_SECONDS = float(os.getenv('BACKGROUND_LEADER_CHECK_SECONDS', '30'))
+
+def start_background_services(app):
+    """Start the threads enabled by TOKEN_REFRESH_SCHEDULER=true and VEHICLE_POLLER=true
+
+    Every gunicorn worker calls this after fork; a LeaderLock picks the one that
+    actually runs them, so vehicles are polled and tokens refreshed once per fleet.
+    """
+    services = []
+    if os.getenv('TOKEN_REFRESH_SCHEDULER', 'false').lower() == 'true':
+        services.append(app.extensions['token_refresh_scheduler'])
+    if os.getenv('VEHICLE_POLLER', 'false').lower() == 'true':
+        services.append(app.extensions['vehicle_poller'])
+    if not services:
+        return
+    with app.app_context():
+        leader = LeaderLock(db.engine, 'smartcar-background-services')
+    
+    def lead():
+        leading = False
+        while True:
+            try:
+                holds = leader.try_acquire()
+            except Exception as e:
+                log.error("background.leader_check_failed", error=str(e))
+                holds = False
+            if holds and not leading:
+                log.info("background.leader_acquired", pid=os.getpid())
+                for service in services:
+                    service.start()
+            elif leading and not holds:
+                log.warning("background.leader_lost", pid=os.getpid())
+                for service in services:
+                    service.stop()
+            leading = holds
+            time.sleep(BACKGROUND_LEADER_CHECK_SECONDS)
+    
+    threading.Thread(target=lead, name='background-leader', daemon=True).start()
+
+_app = None
+_app_lock = threading.Lock()
+
+def get_app():
+    """The process-wide app served by `gunicorn main:app`, built on first use"""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                app = create_app()
+                # a preloading gunicorn master defers these to post_fork (gunicorn.conf.py)
+                if os.getenv('DEFER_BACKGROUND_SERVICES', 'false').lower() != 'true':
+                    start_background_services(app)
+                _app = app
+    return _app
+
+def on_worker_fork():
+    """gunicorn post_fork hook: drop connections inherited from the master, then start background services"""
+    app = get_app()
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_background_services(app)
+
+def __getattr__(name):
+    # `main.app` / `from main import app` builds the app lazily instead of at import
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == '__main__':
+    get_app().run(host='0.0.0.0', port=int(os.getenv('PORT', '5000')))
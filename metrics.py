@@ -0,0 +1,148 @@
+"""
+Prometheus metrics for Smartcar Server
+Route latency, ingest counts, DB query timing, pool gauges, Smartcar call latency and
+dropped log records
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) switches
+prometheus_client to multiprocess mode so /metrics aggregates every worker.
+"""
+
+import os
+import re
+import time
+from functools import lru_cache
+
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from sqlalchemy import event
+
+from app_logging import on_dropped_record
+from query_timing import observe_statements
+from signals import SIGNAL_EVENT_TYPES
+
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+REQUEST_LATENCY = Histogram(
+    'sc_http_request_duration_seconds', 'Flask request latency by route',
+    ['route', 'method', 'status']
+)
+INGEST_SIGNALS = Counter(
+    'sc_ingest_signals_total', 'VEHICLE_STATE signals by code and outcome (stored, failed, unknown)',
+    ['code', 'result', 'source']
+)
+DB_QUERY_LATENCY = Histogram(
+    'sc_db_query_duration_seconds', 'SQL statement latency by operation and table',
+    ['operation', 'table'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'sc_db_pool_checked_out', 'Connections checked out of the SQLAlchemy pool',
+    multiprocess_mode='livesum'
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'sc_db_pool_connections', 'Open connections held by the SQLAlchemy pool (idle and checked out)',
+    multiprocess_mode='livesum'
+)
+SMARTCAR_LATENCY = Histogram(
+    'sc_smartcar_request_duration_seconds', 'Smartcar API call latency by endpoint',
+    ['endpoint', 'status']
+)
+LOG_RECORDS_DROPPED = Counter(
+    'sc_log_records_dropped_total', 'Log records dropped because the log queue was full',
+    ['level']
+)
+
+# unknown signal codes come from the payload; keep them out of label values
+UNKNOWN_CODE = 'unknown'
+
+_STATEMENT = re.compile(r'^\s*(\w+)', re.IGNORECASE)
+_TABLE = re.compile(r'\b(?:from|into|update)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def statement_labels(statement):
+    """(operation, table) for a SQL string; statements are cached strings so this is memoized"""
+    match = _STATEMENT.match(statement)
+    operation = match.group(1).upper() if match else 'OTHER'
+    table = _TABLE.search(statement)
+    return operation, table.group(1) if table else ''
+
+
+def count_signal(code, result, source='webhook'):
+    INGEST_SIGNALS.labels(
+        code=code if code in SIGNAL_EVENT_TYPES else UNKNOWN_CODE, result=result, source=source
+    ).inc()
+
+
+def observe_smartcar_call(endpoint, seconds, status):
+    """SmartcarTransport observer"""
+    SMARTCAR_LATENCY.labels(endpoint=endpoint, status=str(status) if status else 'error').observe(seconds)
+
+
+def _observe_statement(conn, statement, parameters, context, executemany, seconds):
+    operation, table = statement_labels(statement)
+    DB_QUERY_LATENCY.labels(operation=operation, table=table).observe(seconds)
+
+
+def instrument_engine(engine):
+    """Time every statement and track pool usage on the given engine"""
+    observe_statements(engine, _observe_statement)
+    event.listen(engine, 'checkout', lambda *args: DB_POOL_CHECKED_OUT.inc())
+    event.listen(engine, 'checkin', lambda *args: DB_POOL_CHECKED_OUT.dec())
+    event.listen(engine, 'connect', lambda *args: DB_POOL_CONNECTIONS.inc())
+    event.listen(engine, 'close', lambda *args: DB_POOL_CONNECTIONS.dec())
+
+
+def count_dropped_record(record):
+    """app_logging drop observer"""
+    LOG_RECORDS_DROPPED.labels(level=record.levelname.lower()).inc()
+
+
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _observe_request(response):
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_LATENCY.labels(
+            route=route, method=request.method, status=str(response.status_code)
+        ).observe(time.perf_counter() - start)
+    return response
+
+
+def metrics_registry():
+    if not MULTIPROCESS:
+        return REGISTRY
+    from prometheus_client import multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    """(body, content type) for a scrape"""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def metrics_view():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
+def init_app(app):
+    """Time every request, count dropped log records and serve GET /metrics"""
+    on_dropped_record(count_dropped_record)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+def mark_process_dead(pid):
+    """gunicorn child_exit hook: drop a dead worker's live gauges"""
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid)
@@ -1,9 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import load_only
 from datetime import datetime
-import json
+
+from request_timings import json_loads
 
 db = SQLAlchemy()
 
+# owner of vehicles created before a user is known, and the token stored on placeholder vehicles
+DEFAULT_USER_ID = 'default_user'
+PLACEHOLDER_TOKEN = 'placeholder'
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -36,12 +43,17 @@ class Vehicle(db.Model):
     year = db.Column(db.Integer)
     access_token = db.Column(db.Text, nullable=False)
     refresh_token = db.Column(db.Text, nullable=False)
-    token_expires_at = db.Column(db.DateTime, nullable=False)
+    token_expires_at = db.Column(db.DateTime, nullable=False, index=True)  # scanned by the token refresh scheduler
+    last_webhook_at = db.Column(db.DateTime, nullable=True)  # vehicles without recent webhooks are polled
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationship to webhook data
-    webhook_data = db.relationship('WebhookData', backref='vehicle', lazy=True)
+    # Relationship to webhook data; dynamic so touching it never loads the full history
+    webhook_data = db.relationship('WebhookData', backref='vehicle', lazy='dynamic')
+    
+    def latest_signal(self, event_type):
+        """Return the most recent WebhookData entry for one event type"""
+        return WebhookData.latest_for(self.id, event_type)
     
     def to_dict(self):
         return {
@@ -62,31 +74,42 @@ class WebhookData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'), nullable=False)
     event_type = db.Column(db.String(100), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False)
-    data = db.Column(db.Text, nullable=False)  # JSON string
-    raw_data = db.Column(db.Text, nullable=True)  # Full webhook payload as JSON
+    timestamp = db.Column(db.DateTime, nullable=False, index=True)  # exports read in timestamp order
+    # Heavy JSON text columns are deferred; only loaded when accessed or undeferred
+    data = db.deferred(db.Column(db.Text, nullable=False))  # JSON string
+    raw_data = db.deferred(db.Column(db.Text, nullable=True))  # Full webhook payload as JSON
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    @classmethod
+    def latest_for(cls, vehicle_id, event_type):
+        """Return the newest entry for a vehicle and event type, loading data but not raw_data"""
+        return cls.query.options(
+            load_only(cls.id, cls.vehicle_id, cls.event_type, cls.timestamp, cls.data)
+        ).filter_by(
+            vehicle_id=vehicle_id,
+            event_type=event_type
+        ).order_by(cls.timestamp.desc()).first()
+    
     def to_dict(self):
         return {
             'id': self.id,
             'vehicle_id': self.vehicle_id,
             'event_type': self.event_type,
             'timestamp': self.timestamp.isoformat(),
-            'data': json.loads(self.data) if self.data else {},
-            'raw_data': json.loads(self.raw_data) if self.raw_data else {},
+            'data': json_loads(self.data) if self.data else {},
+            'raw_data': json_loads(self.raw_data) if self.raw_data else {},
             'created_at': self.created_at.isoformat()
         }
     
     @property
     def data_dict(self):
         """Return parsed data as dictionary"""
-        return json.loads(self.data) if self.data else {}
+        return json_loads(self.data) if self.data else {}
     
     @property
     def raw_data_dict(self):
         """Return parsed raw_data as dictionary"""
-        return json.loads(self.raw_data) if self.raw_data else {}
+        return json_loads(self.raw_data) if self.raw_data else {}
 
 class UserSession(db.Model):
     __tablename__ = 'user_sessions'
@@ -104,4 +127,24 @@ class UserSession(db.Model):
             'session_token': self.session_token,
             'expires_at': self.expires_at.isoformat(),
             'created_at': self.created_at.isoformat()
-        } 
\ No newline at end of file
+        } 
+
+def upgrade_schema(engine):
+    """Add the columns and indexes newer code reads to tables create_all() left alone
+
+    Every model query selects vehicles.last_webhook_at, so this must run before the new
+    code serves traffic: init_db.py runs it in the build step, POST /migrate-db by hand.
+    Returns the changes applied.
+    """
+    applied = []
+    with engine.begin() as conn:
+        # Index used by the background token refresh scheduler
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_vehicles_token_expires_at ON vehicles(token_expires_at)"))
+        # Time-ordered signal history exports
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_webhook_data_timestamp ON webhook_data(timestamp)"))
+        # Webhook coverage used by the background vehicle poller
+        vehicle_columns = {c['name'] for c in inspect(conn).get_columns('vehicles')}
+        if 'last_webhook_at' not in vehicle_columns:
+            conn.execute(text("ALTER TABLE vehicles ADD COLUMN last_webhook_at TIMESTAMP"))
+            applied.append('vehicles.last_webhook_at')
+    return applied
@@ -0,0 +1,138 @@
+"""
+Query recorder for Smartcar Server
+Counts statements per request, flags repeated query shapes (N+1) and logs slow
+statements with their bound parameters and EXPLAIN plan. Off unless QUERY_LOG=true.
+"""
+
+import contextvars
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+from flask import request
+from app_logging import get_logger, redact
+from query_timing import observe_statements
+
+QUERY_LOG = os.getenv('QUERY_LOG', 'false').lower() == 'true'
+QUERY_LOG_SLOW_MS = float(os.getenv('QUERY_LOG_SLOW_MS', '200'))
+QUERY_LOG_REPEAT_THRESHOLD = int(os.getenv('QUERY_LOG_REPEAT_THRESHOLD', '3'))  # same shape this often = N+1
+QUERY_LOG_EXPLAIN = os.getenv('QUERY_LOG_EXPLAIN', 'true').lower() == 'true'
+
+log = get_logger('query_log')
+
+EXPLAIN_PREFIX = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|\$\d+")
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+@lru_cache(maxsize=1024)
+def query_shape(statement):
+    """Statement with literals and placeholders collapsed, so repeated lookups share one shape"""
+    shape = _LITERAL.sub('?', _WHITESPACE.sub(' ', statement).strip())
+    return _IN_LIST.sub('(?)', shape)
+
+
+class QueryRecorder:
+    """Statements executed while handling one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+        self.shapes[query_shape(statement)] += 1
+
+    def repeated(self, threshold=QUERY_LOG_REPEAT_THRESHOLD):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def bound_parameters(parameters, context):
+    """Parameters keyed by bind name where possible, with token values redacted"""
+    if isinstance(parameters, dict):
+        return redact(parameters)
+    compiled = getattr(context, 'compiled', None)
+    names = getattr(compiled, 'positiontup', None)
+    if names and isinstance(parameters, (list, tuple)) and len(names) == len(parameters):
+        return redact(dict(zip(names, parameters)))
+    return parameters
+
+
+def explain(conn, statement, parameters):
+    """Query plan rows for a SELECT, run on a raw cursor so it is not recorded itself"""
+    prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith('SELECT'):
+        return None
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f"explain failed: {e}"]
+
+
+def _observe_statement(conn, statement, parameters, context, executemany, seconds):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.record(statement, seconds)
+    if seconds * 1000 >= QUERY_LOG_SLOW_MS:
+        log.warning(
+            "query.slow", ms=round(seconds * 1000, 1), statement=statement,
+            parameters=None if executemany else bound_parameters(parameters, context),
+            plan=explain(conn, statement, parameters) if QUERY_LOG_EXPLAIN and not executemany else None,
+            route=_current_route()
+        )
+
+
+def _current_route():
+    try:
+        return request.url_rule.rule if request.url_rule is not None else request.path
+    except RuntimeError:
+        return None  # background thread, no request
+
+
+def instrument_engine(engine):
+    """Record and time statements on the given engine when QUERY_LOG=true"""
+    if not QUERY_LOG:
+        return
+    observe_statements(engine, _observe_statement)
+
+
+def _start_recording():
+    request.environ['query_log.token'] = _recorder.set(QueryRecorder())
+
+
+def _report(exc=None):
+    token = request.environ.pop('query_log.token', None)
+    if token is None:
+        return
+    recorder = _recorder.get()
+    _recorder.reset(token)
+    route = _current_route()
+    for shape, count in recorder.repeated():
+        log.warning("query.repeated", route=route, method=request.method, count=count, shape=shape)
+    log.info(
+        "query.request", route=route, method=request.method, statements=recorder.count,
+        db_ms=round(recorder.total_seconds * 1000, 1), shapes=len(recorder.shapes)
+    )
+
+
+def init_app(app):
+    """Record every request's statements when QUERY_LOG=true"""
+    if not QUERY_LOG:
+        return
+    app.before_request(_start_recording)
+    app.teardown_request(_report)
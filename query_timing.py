@@ -0,0 +1,41 @@
+"""
+Statement timing shared by metrics, query_log and server_timing
+One before/after_cursor_execute pair per engine times every statement once and passes
+the duration to each observer registered for that engine.
+"""
+
+import time
+import weakref
+
+from sqlalchemy import event
+
+# engine -> observers, each called as fn(conn, statement, parameters, context, executemany, seconds)
+_observers = weakref.WeakKeyDictionary()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_timing_start', []).append(time.perf_counter())
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('query_timing_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def observe_statements(engine, observer):
+    """Call observer after every statement executed on engine; the listeners are added once per engine"""
+    observers = _observers.get(engine)
+    if observers is None:
+        observers = _observers[engine] = []
+
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            seconds = time.perf_counter() - conn.info['query_timing_start'].pop()
+            for fn in observers:
+                fn(conn, statement, parameters, context, executemany, seconds)
+
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+    if observer not in observers:
+        observers.append(observer)
@@ -0,0 +1,88 @@
+"""
+Per-request phase timings for Smartcar Server
+Standard library only, so models and the CLI tools can time JSON work without
+importing Flask; server_timing.py turns the totals into the Server-Timing header.
+"""
+
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+
+# header order; 'app' is whatever the view spent outside the other phases
+PHASES = ('db', 'smartcar', 'json', 'render')
+DESCRIPTIONS = {
+    'db': 'Database',
+    'smartcar': 'Smartcar API',
+    'json': 'JSON encode/decode',
+    'render': 'Template render',
+    'app': 'View code',
+}
+
+# the current request's RequestTimings, set by server_timing's before_request hook
+current_timings = contextvars.ContextVar('server_timing', default=None)
+
+
+class RequestTimings:
+    """Seconds and call counts per phase for one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self.render_start = None
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.counts[phase] += 1
+
+    def breakdown(self):
+        """{phase: milliseconds} including 'app' and 'total'"""
+        total = time.perf_counter() - self.start
+        result = {phase: seconds * 1000 for phase, seconds in self.seconds.items()}
+        result['app'] = max(total - sum(self.seconds.values()), 0.0) * 1000
+        result['total'] = total * 1000
+        return result
+
+    def header(self):
+        parts = []
+        for phase, ms in self.breakdown().items():
+            desc = DESCRIPTIONS.get(phase)
+            if phase in self.counts and self.counts[phase] > 1:
+                desc = f"{desc} ({self.counts[phase]})"
+            parts.append(f'{phase};dur={ms:.1f}' + (f';desc="{desc}"' if desc else ''))
+        return ', '.join(parts)
+
+
+def add(phase, seconds):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    """Charge the wall time of the block to phase; a no-op outside a request"""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def json_loads(value):
+    if current_timings.get() is None:
+        return json.loads(value)
+    with timed('json'):
+        return json.loads(value)
+
+
+def json_dumps(value):
+    if current_timings.get() is None:
+        return json.dumps(value)
+    with timed('json'):
+        return json.dumps(value)
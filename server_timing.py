@@ -0,0 +1,97 @@
+"""
+Server-Timing breakdown for Smartcar Server
+Accumulates DB, Smartcar, JSON and template render time for the current request,
+returns it in a Server-Timing header and logs a sampled request.timing record.
+"""
+
+import os
+import time
+
+from flask import before_render_template, request, template_rendered
+from flask.json.provider import DefaultJSONProvider
+from app_logging import get_logger
+from query_timing import observe_statements
+# add, timed, json_loads and json_dumps are used through this module by main.py
+from request_timings import RequestTimings, add, current_timings, json_dumps, json_loads, timed
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'true').lower() == 'true'
+
+log = get_logger('server_timing')
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that charges jsonify and request.get_json to the json phase"""
+
+    def dumps(self, obj, **kwargs):
+        with timed('json'):
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        with timed('json'):
+            return super().loads(s, **kwargs)
+
+
+def observe_smartcar_call(endpoint, seconds, status):
+    """SmartcarTransport observer; calls made on pool threads are timed by the caller instead"""
+    add('smartcar', seconds)
+
+
+def _observe_statement(conn, statement, parameters, context, executemany, seconds):
+    add('db', seconds)
+
+
+def instrument_engine(engine):
+    """Charge statement time on the given engine to the db phase"""
+    if not SERVER_TIMING:
+        return
+    observe_statements(engine, _observe_statement)
+
+
+def _before_render(sender, template, context, **extra):
+    timings = current_timings.get()
+    if timings is not None:
+        timings.render_start = time.perf_counter()
+
+
+def _after_render(sender, template, context, **extra):
+    timings = current_timings.get()
+    if timings is not None and timings.render_start is not None:
+        timings.add('render', time.perf_counter() - timings.render_start)
+        timings.render_start = None
+
+
+def _start_timing():
+    request.environ['server_timing.token'] = current_timings.set(RequestTimings())
+
+
+def _add_header(response):
+    timings = current_timings.get()
+    if timings is None:
+        return response
+    response.headers['Server-Timing'] = timings.header()
+    breakdown = timings.breakdown()
+    log.info(
+        "request.timing", method=request.method, status=response.status_code,
+        route=request.url_rule.rule if request.url_rule is not None else 'unmatched',
+        **{f"{phase}_ms": round(ms, 1) for phase, ms in breakdown.items()},
+        queries=timings.counts['db'], smartcar_calls=timings.counts['smartcar']
+    )
+    return response
+
+
+def _stop_timing(exc=None):
+    token = request.environ.pop('server_timing.token', None)
+    if token is not None:
+        current_timings.reset(token)
+
+
+def init_app(app):
+    """Time every request and add a Server-Timing header when SERVER_TIMING=true"""
+    if not SERVER_TIMING:
+        return
+    app.json = TimedJSONProvider(app)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    app.before_request(_start_timing)
+    app.after_request(_add_header)
+    app.teardown_request(_stop_timing)
@@ -0,0 +1,57 @@
+"""
+Smartcar signal mapping for Smartcar Server
+Maps VEHICLE_STATE signal codes to stored event types, shared by the Flask and async ingest paths
+"""
+
+# signal code -> WebhookData.event_type
+SIGNAL_EVENT_TYPES = {
+    'location-preciselocation': 'Location.PreciseLocation',
+    'odometer-traveleddistance': 'Odometer.TraveledDistance',
+    'tractionbattery-stateofcharge': 'TractionBattery.StateOfCharge',
+    'tractionbattery-nominalcapacity': 'TractionBattery.NominalCapacity',
+    'charge-chargelimits': 'Charge.ChargeLimits',
+}
+
+EVENT_TYPES = list(SIGNAL_EVENT_TYPES.values())
+
+
+def event_metadata(data):
+    """Delivery metadata copied onto every stored signal of a VEHICLE_STATE payload"""
+    meta = data.get("meta", {})
+    return {
+        "event_id": data.get("eventId"),
+        "webhook_id": meta.get("webhookId"),
+        "delivery_id": meta.get("deliveryId"),
+        "delivered_at": meta.get("deliveredAt"),
+        "mode": meta.get("mode")
+    }
+
+
+def enhanced_signal_data(signal, metadata):
+    """The stored data for one signal: its body plus signal and delivery metadata"""
+    signal_meta = signal.get("meta", {})
+    return {
+        "value": signal.get("body", {}),
+        "metadata": dict(
+            {
+                "signal_name": signal.get("name", ""),
+                "signal_group": signal.get("group", ""),
+                "oem_updated_at": signal_meta.get("oemUpdatedAt"),
+                "retrieved_at": signal_meta.get("retrievedAt")
+            },
+            **metadata
+        )
+    }
+
+
+def describe_signal(signal_code, body):
+    """Short human-readable value for log lines"""
+    if signal_code == "location-preciselocation":
+        return f"lat: {body.get('latitude')}, lng: {body.get('longitude')}"
+    if signal_code == "tractionbattery-stateofcharge":
+        return f"value: {body.get('value')}%"
+    if signal_code == "tractionbattery-nominalcapacity":
+        return f"capacity: {body.get('capacity')} kWh"
+    if signal_code == "charge-chargelimits":
+        return f"active limit: {body.get('values', {}).get('activeLimit')}%"
+    return f"value: {body.get('value')}"
@@ -0,0 +1,111 @@
+"""
+Circuit breaker for Smartcar API calls
+Trips on error rate or slow-call rate, fails fast while open and recovers through half-open probes
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from smartcar.exceptions import SmartcarException
+
+from app_logging import get_logger
+
+SMARTCAR_BREAKER_WINDOW_SECONDS = float(os.getenv('SMARTCAR_BREAKER_WINDOW_SECONDS', '60'))
+SMARTCAR_BREAKER_MIN_CALLS = int(os.getenv('SMARTCAR_BREAKER_MIN_CALLS', '10'))
+SMARTCAR_BREAKER_FAILURE_RATE = float(os.getenv('SMARTCAR_BREAKER_FAILURE_RATE', '0.5'))
+SMARTCAR_BREAKER_SLOW_CALL_SECONDS = float(os.getenv('SMARTCAR_BREAKER_SLOW_CALL_SECONDS', '5'))
+SMARTCAR_BREAKER_SLOW_CALL_RATE = float(os.getenv('SMARTCAR_BREAKER_SLOW_CALL_RATE', '0.5'))
+SMARTCAR_BREAKER_OPEN_SECONDS = float(os.getenv('SMARTCAR_BREAKER_OPEN_SECONDS', '30'))
+SMARTCAR_BREAKER_HALF_OPEN_PROBES = int(os.getenv('SMARTCAR_BREAKER_HALF_OPEN_PROBES', '2'))
+
+log = get_logger('smartcar_circuit')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(SmartcarException):
+    """Raised instead of calling Smartcar while the circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, window_seconds=SMARTCAR_BREAKER_WINDOW_SECONDS, min_calls=SMARTCAR_BREAKER_MIN_CALLS,
+                 failure_rate=SMARTCAR_BREAKER_FAILURE_RATE, slow_call_seconds=SMARTCAR_BREAKER_SLOW_CALL_SECONDS,
+                 slow_call_rate=SMARTCAR_BREAKER_SLOW_CALL_RATE, open_seconds=SMARTCAR_BREAKER_OPEN_SECONDS,
+                 half_open_probes=SMARTCAR_BREAKER_HALF_OPEN_PROBES):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._calls = deque()  # (monotonic time, failed, slow)
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError("Smartcar circuit open, skipping call")
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError("Smartcar circuit half-open, probe already in flight")
+                self._probes_in_flight += 1
+
+    def is_open(self):
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def record(self, failed, seconds):
+        """Record a finished call; failed means a transport error or 5xx response"""
+        slow = seconds >= self.slow_call_seconds
+        now = time.monotonic()
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed or slow:
+                    self._trip(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self.state = CLOSED
+                    self._calls.clear()
+                return
+            if self.state == OPEN:
+                return
+            self._calls.append((now, failed, slow))
+            while self._calls and now - self._calls[0][0] > self.window_seconds:
+                self._calls.popleft()
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if failures / total >= self.failure_rate or slow_calls / total >= self.slow_call_rate:
+                self._trip(now)
+
+    def _trip(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self._calls.clear()
+        self._stats['opened'] += 1
+        log.warning("circuit.opened", open_seconds=self.open_seconds)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, state=self.state, window_calls=len(self._calls))
@@ -0,0 +1,205 @@
+"""
+Client-side rate limiting for Smartcar API calls
+Token buckets per app and per vehicle, Retry-After backoff and interactive-over-background priority
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from smartcar.exceptions import SmartcarException
+
+SMARTCAR_APP_RATE = float(os.getenv('SMARTCAR_APP_RATE', '10'))  # requests per second
+SMARTCAR_APP_BURST = float(os.getenv('SMARTCAR_APP_BURST', '20'))
+SMARTCAR_VEHICLE_RATE = float(os.getenv('SMARTCAR_VEHICLE_RATE', '0.5'))
+SMARTCAR_VEHICLE_BURST = float(os.getenv('SMARTCAR_VEHICLE_BURST', '5'))
+SMARTCAR_BACKGROUND_RESERVE = float(os.getenv('SMARTCAR_BACKGROUND_RESERVE', '0.25'))  # share of app burst kept for interactive calls
+SMARTCAR_INTERACTIVE_MAX_WAIT = float(os.getenv('SMARTCAR_INTERACTIVE_MAX_WAIT', '2'))
+SMARTCAR_BACKGROUND_MAX_WAIT = float(os.getenv('SMARTCAR_BACKGROUND_MAX_WAIT', '30'))
+# processes sharing the budget above; each enforces its share (gunicorn.conf.py sets this to its worker count)
+SMARTCAR_RATE_WORKERS = max(int(os.getenv('SMARTCAR_RATE_WORKERS', '1')), 1)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+_MAX_VEHICLE_BUCKETS = 10000
+
+_priority = contextvars.ContextVar('smartcar_priority', default=INTERACTIVE)
+
+
+@contextmanager
+def background_priority():
+    """Mark Smartcar calls made inside the block as background work"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class RateBudgetExceeded(SmartcarException):
+    """Raised instead of calling Smartcar when the rate budget cannot cover the call in time"""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now, reserve=0.0):
+        """Seconds until a token is available while leaving `reserve` tokens untouched"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        needed = 1 + reserve
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+class SmartcarRateLimiter:
+    """Shared rate budget for every outbound Smartcar call
+
+    Background callers may not dip into the reserved share of the app bucket
+    and yield entirely while an interactive caller is waiting. Buckets live in
+    process memory, so with several workers each one gets 1/workers of every
+    rate and burst; a 429's Retry-After only pauses the worker that saw it.
+    """
+
+    def __init__(self, app_rate=SMARTCAR_APP_RATE, app_burst=SMARTCAR_APP_BURST,
+                 vehicle_rate=SMARTCAR_VEHICLE_RATE, vehicle_burst=SMARTCAR_VEHICLE_BURST,
+                 background_reserve=SMARTCAR_BACKGROUND_RESERVE,
+                 interactive_max_wait=SMARTCAR_INTERACTIVE_MAX_WAIT,
+                 background_max_wait=SMARTCAR_BACKGROUND_MAX_WAIT, workers=SMARTCAR_RATE_WORKERS):
+        now = time.monotonic()
+        self.workers = workers
+        # a burst below one token could never be spent
+        app_burst = max(app_burst / workers, 1.0)
+        self.app_bucket = TokenBucket(app_rate / workers, app_burst, now)
+        self.vehicle_rate = vehicle_rate / workers
+        self.vehicle_burst = max(vehicle_burst / workers, 1.0)
+        self.background_reserve = app_burst * background_reserve
+        self.max_wait = {INTERACTIVE: interactive_max_wait, BACKGROUND: background_max_wait}
+        self._vehicle_buckets = {}
+        self._interactive_waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            priority: {'granted': 0, 'rejected': 0, 'waited_ms': 0.0}
+            for priority in (INTERACTIVE, BACKGROUND)
+        }
+        self._stats['rate_limited_responses'] = 0
+
+    def _vehicle_bucket(self, vehicle_id, now):
+        bucket = self._vehicle_buckets.get(vehicle_id)
+        if bucket is None:
+            if len(self._vehicle_buckets) >= _MAX_VEHICLE_BUCKETS:
+                self._vehicle_buckets = {
+                    key: value for key, value in self._vehicle_buckets.items() if not value.idle(now)
+                }
+            bucket = self._vehicle_buckets[vehicle_id] = TokenBucket(self.vehicle_rate, self.vehicle_burst, now)
+        return bucket
+
+    def _try_take(self, now, vehicle_id, priority):
+        if priority == BACKGROUND and self._interactive_waiting:
+            return 0.05
+        reserve = self.background_reserve if priority == BACKGROUND else 0.0
+        buckets = [(self.app_bucket, reserve)]
+        if vehicle_id:
+            buckets.append((self._vehicle_bucket(vehicle_id, now), 0.0))
+        wait = max(bucket.wait_time(now, bucket_reserve) for bucket, bucket_reserve in buckets)
+        if wait == 0:
+            for bucket, _ in buckets:
+                bucket.take()
+        return wait
+
+    def acquire(self, vehicle_id=None, priority=None):
+        """Block until the call fits the budget or raise RateBudgetExceeded"""
+        priority = priority or current_priority()
+        start = time.monotonic()
+        deadline = start + self.max_wait[priority]
+        with self._cond:
+            if priority == INTERACTIVE:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_take(now, vehicle_id, priority)
+                    if wait == 0:
+                        stats = self._stats[priority]
+                        stats['granted'] += 1
+                        stats['waited_ms'] += (now - start) * 1000
+                        return
+                    if now + wait > deadline:
+                        self._stats[priority]['rejected'] += 1
+                        raise RateBudgetExceeded(
+                            f"Smartcar rate budget exhausted ({priority}, retry in {wait:.1f}s)"
+                        )
+                    self._cond.wait(wait)
+            finally:
+                if priority == INTERACTIVE:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+
+    def penalize(self, vehicle_id, retry_after):
+        """Honour a 429 Retry-After by blocking the vehicle bucket (or the whole app)"""
+        now = time.monotonic()
+        with self._cond:
+            self._stats['rate_limited_responses'] += 1
+            bucket = self._vehicle_bucket(vehicle_id, now) if vehicle_id else self.app_bucket
+            bucket.blocked_until = max(bucket.blocked_until, now + (retry_after or 1.0))
+            bucket.tokens = 0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._cond:
+            self.app_bucket._refill(now)
+            return {
+                'app_tokens': round(self.app_bucket.tokens, 2),
+                'app_capacity': self.app_bucket.capacity,
+                'app_rate': self.app_bucket.rate,
+                'workers': self.workers,
+                'app_blocked_for': round(max(self.app_bucket.blocked_until - now, 0), 2),
+                'vehicle_buckets': len(self._vehicle_buckets),
+                'interactive': dict(self._stats[INTERACTIVE]),
+                'background': dict(self._stats[BACKGROUND]),
+                'rate_limited_responses': self._stats['rate_limited_responses']
+            }
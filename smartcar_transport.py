@@ -0,0 +1,177 @@
+"""
+Shared HTTP transport for Smartcar API calls
+Pooled keep-alive session with connect/read timeouts, bounded retries and per-endpoint latency stats
+"""
+
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+import smartcar.const
+import smartcar.requester
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app_logging import get_logger
+from smartcar_rate_limit import parse_retry_after
+
+SMARTCAR_CONNECT_TIMEOUT = float(os.getenv('SMARTCAR_CONNECT_TIMEOUT', '3.05'))
+SMARTCAR_READ_TIMEOUT = float(os.getenv('SMARTCAR_READ_TIMEOUT', '15'))
+SMARTCAR_MAX_RETRIES = int(os.getenv('SMARTCAR_MAX_RETRIES', '2'))
+SMARTCAR_BACKOFF_FACTOR = float(os.getenv('SMARTCAR_BACKOFF_FACTOR', '0.5'))
+SMARTCAR_MAX_RETRY_AFTER = float(os.getenv('SMARTCAR_MAX_RETRY_AFTER', '5'))
+SMARTCAR_POOL_SIZE = int(os.getenv('SMARTCAR_POOL_SIZE', '20'))
+# point the SDK at another Smartcar, e.g. fake_smartcar.py; unset keeps the SDK defaults
+SMARTCAR_API_URL = os.getenv('SMARTCAR_API_URL')
+SMARTCAR_AUTH_URL = os.getenv('SMARTCAR_AUTH_URL')
+SMARTCAR_CONNECT_URL = os.getenv('SMARTCAR_CONNECT_URL')
+
+log = get_logger('smartcar_transport')
+
+# no 429: a retry inside the adapter would skip the rate budget and cut the server's Retry-After
+# short; the 429 goes back to the limiter instead and the call fails fast
+RETRY_STATUSES = (500, 502, 503, 504)
+
+_VEHICLE_ID_PATH = re.compile(r'/vehicles/([^/]+)')
+
+
+class _CappedRetry(Retry):
+    """Retry that never sleeps longer than SMARTCAR_MAX_RETRY_AFTER on a 503's Retry-After header"""
+
+    # urllib3 retries 413/429/503 carrying a Retry-After even outside status_forcelist
+    RETRY_AFTER_STATUS_CODES = frozenset([503])
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, SMARTCAR_MAX_RETRY_AFTER)
+
+
+def vehicle_id_from_url(url):
+    match = _VEHICLE_ID_PATH.search(urlsplit(url).path)
+    return match.group(1) if match else None
+
+
+def endpoint_name(method, url):
+    """Low-cardinality label for a Smartcar URL, e.g. 'GET api.smartcar.com/v1.0/vehicles/:id/odometer'"""
+    parts = urlsplit(url)
+    path = _VEHICLE_ID_PATH.sub('/vehicles/:id', parts.path).rstrip('/')
+    return f"{method.upper()} {parts.netloc}{path}"
+
+
+class SmartcarTransport:
+    """Drop-in replacement for the `requests` module inside the Smartcar SDK
+
+    The SDK calls requests.request(method, url, timeout=310, ...) for every API
+    and auth call; routing that through one pooled Session keeps TLS
+    connections alive between calls and enforces our own timeouts.
+    Only idempotent methods are retried: token exchanges are POSTs and
+    refresh tokens are single-use. With a limiter, every call first takes a
+    token from the shared rate budget and 429s feed Retry-After back into it
+    instead of being retried.
+    With a breaker, transport errors, 5xx and slow calls can open the circuit.
+    """
+
+    def __init__(self, connect_timeout=SMARTCAR_CONNECT_TIMEOUT, read_timeout=SMARTCAR_READ_TIMEOUT,
+                 max_retries=SMARTCAR_MAX_RETRIES, backoff_factor=SMARTCAR_BACKOFF_FACTOR,
+                 pool_size=SMARTCAR_POOL_SIZE, limiter=None, breaker=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = limiter
+        self.breaker = breaker
+        retry = _CappedRetry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # observers are called as fn(endpoint, seconds, status) after every call
+        self.observers = []
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, timeout=None, **kwargs):
+        # the SDK hard-codes timeout=310; always use our connect/read pair instead
+        endpoint = endpoint_name(method, url)
+        vehicle_id = vehicle_id_from_url(url)
+        if self.breaker is not None and self.breaker.is_open():
+            # fail fast without spending rate budget or waiting for it
+            self.breaker.before_call()
+        if self.limiter is not None:
+            self.limiter.acquire(vehicle_id)
+        if self.breaker is not None:
+            self.breaker.before_call()
+        status = None
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            status = response.status_code
+            if status == 429 and self.limiter is not None:
+                self.limiter.penalize(vehicle_id, parse_retry_after(response.headers.get('Retry-After')))
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            if self.breaker is not None:
+                self.breaker.record(status is None or status >= 500, seconds)
+            self._record(endpoint, seconds, status)
+
+    def _record(self, endpoint, seconds, status):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            stats['count'] += 1
+            if status is None or status >= 400:
+                stats['errors'] += 1
+            elapsed_ms = seconds * 1000
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['last_status'] = status
+        for observer in self.observers:
+            try:
+                observer(endpoint, seconds, status)
+            except Exception as e:
+                log.error("transport.observer_failed", endpoint=endpoint, error=str(e))
+
+    def stats(self):
+        """Per-endpoint call counts, error counts and latency"""
+        with self._lock:
+            return {
+                endpoint: dict(
+                    stats,
+                    total_ms=round(stats['total_ms'], 2),
+                    max_ms=round(stats['max_ms'], 2),
+                    avg_ms=round(stats['total_ms'] / stats['count'], 2)
+                )
+                for endpoint, stats in self._stats.items()
+            }
+
+
+def install_transport(transport):
+    """Route every Smartcar SDK HTTP call through the given transport"""
+    smartcar.requester.requests = transport
+    return transport
+
+
+def configure_base_urls(api_url=SMARTCAR_API_URL, auth_url=SMARTCAR_AUTH_URL, connect_url=SMARTCAR_CONNECT_URL):
+    """Override the SDK's API, token and Connect URLs; the SDK reads them on every call"""
+    if api_url:
+        smartcar.const.API_URL = api_url.rstrip('/')
+    if auth_url:
+        smartcar.const.AUTH_URL = auth_url
+    if connect_url:
+        smartcar.const.CONNECT_URL = connect_url.rstrip('/')
+    if api_url or auth_url or connect_url:
+        log.info("smartcar.base_urls", api_url=smartcar.const.API_URL, auth_url=smartcar.const.AUTH_URL,
+                 connect_url=smartcar.const.CONNECT_URL)
@@ -0,0 +1,75 @@
+"""
+Signal history archive and the exports that read it back
+
+    python -m pytest test_archive.py
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+import archive
+import export_webhooks
+from db_backend import make_engine
+from models import db, User, Vehicle, WebhookData
+
+NOW = datetime(2025, 6, 1)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, 'ARCHIVE_URI', str(tmp_path / 'archive'))
+    engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__).values(id=1, smartcar_user_id='user-1'))
+        conn.execute(insert(Vehicle.__table__), [
+            {'id': pk, 'smartcar_vehicle_id': f"vehicle-{pk}", 'user_id': 1, 'access_token': 'a',
+             'refresh_token': 'r', 'token_expires_at': NOW}
+            for pk in (1, 2)
+        ])
+        # ids out of timestamp order, as from an import of older history
+        conn.execute(insert(WebhookData.__table__), [
+            {'id': 100 - hour, 'vehicle_id': 1 + hour % 2, 'event_type': 'Odometer.TraveledDistance',
+             'timestamp': NOW - timedelta(hours=hour), 'data': json.dumps({'value': {'value': hour}})}
+            for hour in range(0, 24 * 60, 7)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def export(engine, **filters):
+    return [json.loads(line) for chunk in export_webhooks.export_chunks(engine, 'ndjson', **filters)
+            for line in chunk.splitlines()]
+
+
+def test_export_is_unchanged_by_archiving_with_a_later_cutoff(engine):
+    before = export(engine)
+    assert [row['timestamp'] for row in before] == sorted(row['timestamp'] for row in before)
+
+    cutoff = NOW - timedelta(days=10)
+    assert archive.archive_cold_history(engine, cutoff)
+    # later than ARCHIVE_AFTER_DAYS: the export must still look in the archive
+    assert archive.archived_before() == cutoff
+    assert archive.reaches_archive(NOW - timedelta(days=20))
+    assert not archive.reaches_archive(NOW - timedelta(days=5))
+
+    assert export(engine) == before
+    start = NOW - timedelta(days=30)
+    assert export(engine, vehicle_id='vehicle-2', start=start) == [
+        row for row in before if row['vehicle_id'] == 'vehicle-2' and row['timestamp'] >= start.isoformat()
+    ]
+
+
+def test_rows_left_in_the_table_by_an_interrupted_run_are_exported_once(engine, monkeypatch):
+    before = export(engine)
+
+    def interrupted(table):
+        raise RuntimeError('interrupted before the delete')
+
+    monkeypatch.setattr(archive, 'delete', interrupted)
+    assert archive.archive_cold_history(engine, NOW) == {}
+    assert archive.archived_before() == NOW
+    assert export(engine) == before
@@ -0,0 +1,42 @@
+"""
+Benchmark regression check without a usable baseline
+
+    python -m pytest test_check_benchmarks.py
+"""
+
+import json
+import os
+
+import pytest
+
+import check_benchmarks
+
+
+@pytest.fixture
+def baseline_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(check_benchmarks, 'BENCHMARK_BASELINE_DIR', str(tmp_path / 'baseline'))
+    monkeypatch.setattr(check_benchmarks, 'run_pytest', lambda options: pytest.fail(f"ran pytest with {options}"))
+    return tmp_path / 'baseline'
+
+
+def save_baseline(directory, machine_id):
+    os.makedirs(directory / machine_id)
+    (directory / machine_id / '0001_baseline.json').write_text(json.dumps({'benchmarks': []}))
+
+
+def test_fails_without_a_baseline(baseline_dir):
+    assert check_benchmarks.main([]) == 1
+
+
+def test_fails_with_only_another_machines_baseline(baseline_dir):
+    save_baseline(baseline_dir, 'Windows-PyPy-3.9-64bit')
+    assert check_benchmarks.main([]) == 1
+
+
+def test_compares_against_this_machines_baseline(baseline_dir, monkeypatch):
+    save_baseline(baseline_dir, check_benchmarks.get_machine_id())
+    runs = []
+    monkeypatch.setattr(check_benchmarks, 'run_pytest', lambda options: runs.append(options) or 0)
+    assert check_benchmarks.main(['--max-regression', '15']) == 0
+    assert runs == [[f"--benchmark-compare={baseline_dir / check_benchmarks.get_machine_id() / '0001_baseline.json'}",
+                     '--benchmark-compare-fail=min:15%']]
@@ -0,0 +1,57 @@
+"""
+Smartcar rate budget split between gunicorn workers
+
+    python -m pytest test_rate_limit.py
+"""
+
+import os
+import runpy
+
+from smartcar_rate_limit import INTERACTIVE, RateBudgetExceeded, SmartcarRateLimiter
+
+
+def drain(limiter, vehicle_id=None):
+    """Calls granted before the budget is empty"""
+    granted = 0
+    while True:
+        try:
+            limiter.acquire(vehicle_id, INTERACTIVE)
+        except RateBudgetExceeded:
+            return granted
+        granted += 1
+
+
+def limiter(**kwargs):
+    # no waiting: count only what the bursts allow
+    return SmartcarRateLimiter(app_rate=10, app_burst=20, vehicle_rate=0.5, vehicle_burst=8,
+                               interactive_max_wait=0, **kwargs)
+
+
+def test_each_worker_gets_its_share_of_the_app_budget():
+    workers = [limiter(workers=4) for _ in range(4)]
+    assert [drain(worker) for worker in workers] == [5, 5, 5, 5]
+    assert workers[0].app_bucket.rate == 2.5
+
+
+def test_each_worker_gets_its_share_of_a_vehicle_budget():
+    workers = [limiter(workers=2) for _ in range(2)]
+    assert sum(drain(worker, 'vehicle-1') for worker in workers) == 8
+
+
+def test_single_worker_keeps_the_full_budget():
+    assert drain(limiter(workers=1)) == 20
+
+
+def test_burst_never_drops_below_one_call():
+    assert drain(limiter(workers=50), 'vehicle-1') == 1
+
+
+def test_gunicorn_config_shares_the_budget_between_its_workers(monkeypatch, tmp_path):
+    monkeypatch.setenv('WEB_CONCURRENCY', '3')
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path / 'metrics'))
+    # setdefault in the config writes these; delenv restores them afterwards
+    monkeypatch.delenv('SMARTCAR_RATE_WORKERS', raising=False)
+    monkeypatch.delenv('DEFER_BACKGROUND_SERVICES', raising=False)
+    config = runpy.run_path(os.path.join(os.path.dirname(__file__), 'gunicorn.conf.py'))
+    assert config['workers'] == 3
+    assert os.environ['SMARTCAR_RATE_WORKERS'] == '3'
@@ -0,0 +1,55 @@
+"""
+Smartcar transport retries against the fake Smartcar server
+
+    python -m pytest test_smartcar_transport.py
+"""
+
+import time
+
+import pytest
+
+import fake_smartcar
+from smartcar_rate_limit import INTERACTIVE, RateBudgetExceeded, SmartcarRateLimiter
+from smartcar_transport import SmartcarTransport
+
+
+@pytest.fixture
+def fake():
+    server = fake_smartcar.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def limiter():
+    return SmartcarRateLimiter(interactive_max_wait=0, workers=1)
+
+
+def odometer(fake, transport, vehicle_id='vehicle-1'):
+    url = f"{fake_smartcar.base_urls(fake)['SMARTCAR_API_URL']}/vehicles/{vehicle_id}/odometer"
+    return transport.request('GET', url, headers={'Authorization': 'Bearer test-token'})
+
+
+def test_a_429_is_not_retried_and_blocks_the_budget_for_its_retry_after(fake, limiter):
+    fake.fake.update({'rate_limit_rate': 1.0, 'retry_after': 30})
+    transport = SmartcarTransport(backoff_factor=0, limiter=limiter)
+
+    start = time.monotonic()
+    response = odometer(fake, transport)
+    assert response.status_code == 429
+    assert time.monotonic() - start < 1
+    assert fake.fake.stats['odometer'] == {'429': 1}
+
+    stats = limiter.stats()
+    assert stats['interactive']['granted'] == 1
+    assert stats['rate_limited_responses'] == 1
+    with pytest.raises(RateBudgetExceeded):
+        limiter.acquire('vehicle-1', INTERACTIVE)
+
+
+def test_server_errors_are_retried(fake, limiter):
+    fake.fake.update({'error_rate': 1.0})
+    transport = SmartcarTransport(max_retries=2, backoff_factor=0, limiter=limiter)
+
+    assert odometer(fake, transport).status_code == 500
+    assert fake.fake.stats['odometer'] == {'500': 3}
@@ -0,0 +1,114 @@
+"""
+Token refresh against the fake Smartcar server with single-use refresh tokens
+
+    python -m pytest test_token_refresh.py
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+import smartcar
+from sqlalchemy import select, update
+
+import fake_smartcar
+import main
+from models import db, User, Vehicle
+
+
+@pytest.fixture
+def fake():
+    server = fake_smartcar.start(config={'strict_refresh': True, 'vehicles': 3})
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def app(fake, tmp_path, monkeypatch):
+    monkeypatch.setenv('SMARTCAR_CLIENT_ID', 'test-client')
+    monkeypatch.setenv('SMARTCAR_CLIENT_SECRET', 'test-secret')
+    monkeypatch.setenv('SMARTCAR_REDIRECT_URI', 'http://localhost/exchange')
+    monkeypatch.setattr(main, '_client', None)
+    for name in ('API_URL', 'AUTH_URL', 'CONNECT_URL'):
+        monkeypatch.setattr(smartcar.const, name, getattr(smartcar.const, name))
+    urls = fake_smartcar.base_urls(fake)
+    main.configure_base_urls(urls['SMARTCAR_API_URL'], urls['SMARTCAR_AUTH_URL'], urls['SMARTCAR_CONNECT_URL'])
+
+    app = main.create_app({'SECRET_KEY': 'test', 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def account(app):
+    """Vehicle ids and the refresh token they share after one /exchange, with the access token expired"""
+    with app.app_context():
+        token = main.get_client().exchange_code('test-code')
+        vehicle_ids = main.list_vehicle_ids(token['access_token'])
+        main.register_vehicles(vehicle_ids, token)
+        db.session.execute(update(Vehicle).values(token_expires_at=datetime.utcnow() - timedelta(minutes=1)))
+        db.session.commit()
+    return vehicle_ids, token['refresh_token']
+
+
+def test_vehicles_on_one_connection_spend_the_refresh_token_once(app, fake, account):
+    vehicle_ids, refresh_token = account
+    results = {}
+
+    def refresh(vehicle_id, attempt):
+        with app.app_context():
+            results[vehicle_id, attempt] = main.refresh_access_token_db(refresh_token, vehicle_id)
+
+    threads = [threading.Thread(target=refresh, args=(vehicle_id, attempt))
+               for vehicle_id in vehicle_ids for attempt in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(vehicle_ids) == 3
+    assert all(results.values())
+    # one code exchange and one refresh, never a reused token
+    assert fake.fake.stats['token'] == {'200': 2}
+    with app.app_context():
+        stored = set(db.session.execute(select(Vehicle.refresh_token)).scalars())
+    assert len(stored) == 1 and refresh_token not in stored
+    assert main._refresh_locks == {}
+
+
+def test_get_access_token_after_refresh_on_another_vehicle(app, account):
+    vehicle_ids, refresh_token = account
+    with app.app_context():
+        first = main.get_access_token(vehicle_ids[0])
+        others = [main.get_access_token(vehicle_id) for vehicle_id in vehicle_ids[1:]]
+    assert first and first['refresh_token'] != refresh_token
+    assert all(other['access_token'] == first['access_token'] for other in others)
+
+
+def test_refresh_leaves_the_callers_session_alone(app, account):
+    vehicle_ids, refresh_token = account
+    with app.app_context():
+        # pending, not flushed: on sqlite a flushed write would hold the only write lock
+        db.session.add(User(smartcar_user_id='pending-user', email='pending@example.com'))
+        assert main.refresh_access_token_db(refresh_token, vehicle_ids[0])
+        db.session.rollback()
+        assert db.session.execute(select(User).filter_by(smartcar_user_id='pending-user')).first() is None
+
+
+def test_vehicle_info_reads_the_cache_and_refreshes_in_the_background(app, fake, account, monkeypatch):
+    vehicle_ids, refresh_token = account
+    submitted = []
+    monkeypatch.setattr(main, '_attribute_refreshes', {})
+    monkeypatch.setattr(main.background_pool, 'submit', lambda fn, *args: submitted.append((fn, args)))
+
+    response = app.test_client().get(f"/api/vehicle/{vehicle_ids[0]}/info")
+    assert response.status_code == 200
+    assert response.get_json()['make'] is None
+    # the expired token is left alone on the request path
+    assert fake.fake.stats['token'] == {'200': 1}
+
+    [(fn, args)] = submitted
+    info = fn(*args)
+    assert info and fake.fake.stats['token'] == {'200': 2}
+    assert app.test_client().get(f"/api/vehicle/{vehicle_ids[0]}/info").get_json()['make'] == info['make']
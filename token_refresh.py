@@ -0,0 +1,120 @@
+"""
+Background token refresh for Smartcar Server
+Refreshes vehicle access tokens a margin before they expire so request paths never wait on it
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app_logging import get_logger
+from models import db, Vehicle
+from smartcar_rate_limit import background_priority
+
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv('TOKEN_REFRESH_MARGIN_SECONDS', '900'))
+TOKEN_REFRESH_INTERVAL_SECONDS = int(os.getenv('TOKEN_REFRESH_INTERVAL_SECONDS', '60'))
+TOKEN_REFRESH_JITTER_SECONDS = float(os.getenv('TOKEN_REFRESH_JITTER_SECONDS', '5'))
+TOKEN_REFRESH_MAX_WORKERS = int(os.getenv('TOKEN_REFRESH_MAX_WORKERS', '4'))
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv('TOKEN_REFRESH_BATCH_SIZE', '100'))
+TOKEN_REFRESH_MAX_BACKOFF_SECONDS = int(os.getenv('TOKEN_REFRESH_MAX_BACKOFF_SECONDS', '3600'))
+
+log = get_logger('token_refresh')
+
+
+class TokenRefreshScheduler:
+    """Periodically refreshes tokens that expire within the configured margin
+
+    refresh_fn(refresh_token, vehicle_id) performs the exchange and persists the
+    result (main.refresh_access_token_db).
+    """
+
+    def __init__(self, app, refresh_fn, margin_seconds=TOKEN_REFRESH_MARGIN_SECONDS,
+                 interval_seconds=TOKEN_REFRESH_INTERVAL_SECONDS, jitter_seconds=TOKEN_REFRESH_JITTER_SECONDS,
+                 max_workers=TOKEN_REFRESH_MAX_WORKERS, batch_size=TOKEN_REFRESH_BATCH_SIZE,
+                 placeholder_token='placeholder'):
+        self.app = app
+        self.refresh_fn = refresh_fn
+        self.margin = timedelta(seconds=margin_seconds)
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.placeholder_token = placeholder_token
+        self._failures = {}  # vehicle_id -> (attempts, retry_after monotonic)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            if not self._stop.is_set():
+                return
+            # stopped (e.g. by a leader handover) but still finishing a cycle; never run two loops
+            self._thread.join()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='token-refresh', daemon=True)
+        self._thread.start()
+        log.info("token_refresh.started", margin_seconds=self.margin.total_seconds(), interval_seconds=self.interval_seconds)
+
+    def stop(self):
+        self._stop.set()
+
+    def due_vehicles(self):
+        """Vehicles whose tokens expire within the margin, soonest first (uses the token_expires_at index)"""
+        cutoff = datetime.utcnow() + self.margin
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(Vehicle.smartcar_vehicle_id, Vehicle.refresh_token)
+                .where(Vehicle.token_expires_at <= cutoff)
+                .where(Vehicle.refresh_token != self.placeholder_token)
+                .order_by(Vehicle.token_expires_at)
+                .limit(self.batch_size)
+            ).all()
+        now = time.monotonic()
+        return [
+            (vehicle_id, refresh_token) for vehicle_id, refresh_token in rows
+            if self._failures.get(vehicle_id, (0, 0))[1] <= now
+        ]
+
+    def run_once(self):
+        """Refresh every due vehicle with bounded concurrency; returns the number refreshed"""
+        due = self.due_vehicles()
+        if not due:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='token-refresh') as pool:
+            futures = {pool.submit(self._refresh, vehicle_id, refresh_token): vehicle_id
+                       for vehicle_id, refresh_token in due}
+            wait(futures)
+        refreshed = sum(1 for future in futures if future.result())
+        log.info("token_refresh.cycle", refreshed=refreshed, due=len(due))
+        return refreshed
+
+    def _refresh(self, vehicle_id, refresh_token):
+        # jitter spreads refreshes so a batch never hits Smartcar at the same instant
+        time.sleep(random.uniform(0, self.jitter_seconds))
+        try:
+            with self.app.app_context(), background_priority():
+                new_token = self.refresh_fn(refresh_token, vehicle_id)
+        except Exception as e:
+            log.error("token_refresh.failed", vehicle_id=vehicle_id, error=str(e))
+            new_token = None
+        if new_token:
+            self._failures.pop(vehicle_id, None)
+            return True
+        # exponential backoff so a revoked refresh token is not retried every tick
+        attempts = self._failures.get(vehicle_id, (0, 0))[0] + 1
+        delay = min(self.interval_seconds * (2 ** attempts), TOKEN_REFRESH_MAX_BACKOFF_SECONDS)
+        self._failures[vehicle_id] = (attempts, time.monotonic() + delay)
+        return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log.exception("token_refresh.cycle_failed")
+            self._stop.wait(self.interval_seconds + random.uniform(0, self.jitter_seconds))
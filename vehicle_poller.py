@@ -0,0 +1,240 @@
+"""
+Background polling for vehicles without webhook coverage
+Fetches signals on an adaptive schedule and stores them through the webhook ingest path
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import smartcar
+from sqlalchemy import or_, select
+
+from app_logging import get_logger
+from models import db, Vehicle
+from smartcar_circuit import CircuitOpenError
+from smartcar_rate_limit import RateBudgetExceeded, background_priority
+
+VEHICLE_POLLER_TICK_SECONDS = float(os.getenv('VEHICLE_POLLER_TICK_SECONDS', '15'))
+VEHICLE_POLLER_ACTIVE_SECONDS = float(os.getenv('VEHICLE_POLLER_ACTIVE_SECONDS', '60'))  # driving or charging
+VEHICLE_POLLER_PARKED_SECONDS = float(os.getenv('VEHICLE_POLLER_PARKED_SECONDS', '1800'))
+VEHICLE_POLLER_WEBHOOK_WINDOW_SECONDS = int(os.getenv('VEHICLE_POLLER_WEBHOOK_WINDOW_SECONDS', str(6 * 3600)))
+VEHICLE_POLLER_MAX_WORKERS = int(os.getenv('VEHICLE_POLLER_MAX_WORKERS', '4'))
+VEHICLE_POLLER_BATCH_SIZE = int(os.getenv('VEHICLE_POLLER_BATCH_SIZE', '100'))
+
+log = get_logger('vehicle_poller')
+
+# stored as metadata.mode on every polled signal
+POLL_MODE = 'poll'
+
+POLL_PATHS = ['/location', '/odometer', '/battery', '/charge']
+
+
+def poll_signals(responses):
+    """Turn a Smartcar batch response into VEHICLE_STATE signals plus an activity snapshot"""
+    retrieved_at = int(time.time() * 1000)
+    signals = []
+    snapshot = {}
+
+    def body(path):
+        response = responses.get(path) or {}
+        return response.get('body') if response.get('code') == 200 else None
+
+    location = body('/location')
+    if location:
+        snapshot['location'] = (location.get('latitude'), location.get('longitude'))
+        signals.append({
+            'code': 'location-preciselocation', 'name': 'PreciseLocation', 'group': 'Location',
+            'body': {'latitude': location.get('latitude'), 'longitude': location.get('longitude')}
+        })
+    odometer = body('/odometer')
+    if odometer:
+        snapshot['odometer'] = odometer.get('distance')
+        signals.append({
+            'code': 'odometer-traveleddistance', 'name': 'TraveledDistance', 'group': 'Odometer',
+            'body': {'value': odometer.get('distance')}
+        })
+    battery = body('/battery')
+    if battery and battery.get('percentRemaining') is not None:
+        signals.append({
+            'code': 'tractionbattery-stateofcharge', 'name': 'StateOfCharge', 'group': 'TractionBattery',
+            'body': {'value': round(battery['percentRemaining'] * 100, 1)}
+        })
+    charge = body('/charge')
+    if charge:
+        snapshot['charging'] = charge.get('state') == 'CHARGING'
+
+    for signal in signals:
+        signal['meta'] = {'retrievedAt': retrieved_at}
+    return signals, snapshot
+
+
+class VehiclePoller:
+    """Polls vehicles that have no recent webhook delivery
+
+    token_fn(vehicle_id) returns the stored token dict (main.get_access_token) and
+    ingest_fn(payload) stores a VEHICLE_STATE payload the same way /webhook does.
+    Each vehicle is polled every active_seconds while it is driving or charging;
+    otherwise its interval doubles up to parked_seconds. Calls run at background
+    priority so they only spend rate budget that interactive requests leave over.
+    Each tick looks at the next batch_size uncovered vehicles, so a fleet of N of
+    them is fully scanned every ceil(N / batch_size) ticks.
+    """
+
+    def __init__(self, app, token_fn, ingest_fn, tick_seconds=VEHICLE_POLLER_TICK_SECONDS,
+                 active_seconds=VEHICLE_POLLER_ACTIVE_SECONDS, parked_seconds=VEHICLE_POLLER_PARKED_SECONDS,
+                 webhook_window_seconds=VEHICLE_POLLER_WEBHOOK_WINDOW_SECONDS,
+                 max_workers=VEHICLE_POLLER_MAX_WORKERS, batch_size=VEHICLE_POLLER_BATCH_SIZE,
+                 placeholder_token='placeholder'):
+        self.app = app
+        self.token_fn = token_fn
+        self.ingest_fn = ingest_fn
+        self.tick_seconds = tick_seconds
+        self.active_seconds = active_seconds
+        self.parked_seconds = parked_seconds
+        self.webhook_window = timedelta(seconds=webhook_window_seconds)
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.placeholder_token = placeholder_token
+        self._schedule = {}  # vehicle_id -> (next poll monotonic, interval seconds)
+        self._snapshots = {}  # vehicle_id -> last activity snapshot
+        self._pks = {}  # vehicle_id -> Vehicle.id, to tell which page a scheduled vehicle is on
+        self._cursor = 0  # last Vehicle.id of the previous page
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            if not self._stop.is_set():
+                return
+            # stopped (e.g. by a leader handover) but still finishing a cycle; never run two loops
+            self._thread.join()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='vehicle-poller', daemon=True)
+        self._thread.start()
+        log.info("poller.started", active_seconds=self.active_seconds, parked_seconds=self.parked_seconds)
+
+    def stop(self):
+        self._stop.set()
+
+    def uncovered_vehicles(self):
+        """The next page of (pk, vehicle id) with real tokens and no webhook within the coverage window
+
+        Pages follow Vehicle.id from a cursor kept between ticks and wrap around at the
+        end, so every uncovered vehicle is reached however large the fleet is. Also
+        returns the scanned pk range (low, high], with high None for the last page.
+        """
+        cutoff = datetime.utcnow() - self.webhook_window
+        low = self._cursor
+        with self.app.app_context():
+            rows = db.session.execute(
+                select(Vehicle.id, Vehicle.smartcar_vehicle_id)
+                .where(Vehicle.id > low)
+                .where(Vehicle.refresh_token != self.placeholder_token)
+                .where(or_(Vehicle.last_webhook_at.is_(None), Vehicle.last_webhook_at < cutoff))
+                .order_by(Vehicle.id)
+                .limit(self.batch_size)
+            ).all()
+        # a short page is the end of the table: the next tick starts from the beginning
+        self._cursor = rows[-1][0] if len(rows) == self.batch_size else 0
+        return rows, low, self._cursor or None
+
+    def due_vehicles(self):
+        rows, low, high = self.uncovered_vehicles()
+        now = time.monotonic()
+        with self._lock:
+            # forget vehicles in the scanned range that gained webhook coverage or were removed
+            scanned = {vehicle_id for _, vehicle_id in rows}
+            for vehicle_id, vehicle_pk in list(self._pks.items()):
+                if vehicle_pk > low and (high is None or vehicle_pk <= high) and vehicle_id not in scanned:
+                    self._pks.pop(vehicle_id, None)
+                    self._schedule.pop(vehicle_id, None)
+                    self._snapshots.pop(vehicle_id, None)
+            due = []
+            for vehicle_pk, vehicle_id in rows:
+                self._pks[vehicle_id] = vehicle_pk
+                # a vehicle seen for the first time is due now; paging already spreads
+                # a restart's first polls over batch_size vehicles per tick
+                if self._schedule.get(vehicle_id, (now, None))[0] <= now:
+                    due.append(vehicle_id)
+            return due
+
+    def run_once(self):
+        """Poll every due vehicle with bounded concurrency; returns the number stored"""
+        due = self.due_vehicles()
+        if not due:
+            return 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='vehicle-poller') as pool:
+            futures = [pool.submit(self._poll, vehicle_id) for vehicle_id in due]
+            wait(futures)
+        polled = sum(1 for future in futures if future.result())
+        log.info("poller.cycle", polled=polled, due=len(due))
+        return polled
+
+    def _poll(self, vehicle_id):
+        _, interval = self._schedule.get(vehicle_id, (0, self.active_seconds))
+        try:
+            with self.app.app_context(), background_priority():
+                token_data = self.token_fn(vehicle_id)
+                if not token_data:
+                    self._reschedule(vehicle_id, self.parked_seconds)
+                    return False
+                responses = smartcar.Vehicle(vehicle_id, token_data['access_token']).batch(POLL_PATHS)
+                signals, snapshot = poll_signals(responses)
+                if signals:
+                    self.ingest_fn(self._payload(vehicle_id, signals))
+        except (RateBudgetExceeded, CircuitOpenError) as e:
+            # Smartcar is busy or degraded; keep the interval and try again later
+            log.info("poller.deferred", vehicle_id=vehicle_id, reason=str(e))
+            self._reschedule(vehicle_id, interval)
+            return False
+        except Exception as e:
+            log.error("poller.failed", vehicle_id=vehicle_id, error=str(e))
+            self._reschedule(vehicle_id, min(interval * 2, self.parked_seconds))
+            return False
+        self._reschedule(vehicle_id, self._next_interval(vehicle_id, interval, snapshot))
+        return bool(signals)
+
+    def _next_interval(self, vehicle_id, interval, snapshot):
+        previous = self._snapshots.get(vehicle_id)
+        self._snapshots[vehicle_id] = snapshot
+        moved = previous is not None and any(
+            snapshot.get(key) is not None and snapshot.get(key) != previous.get(key)
+            for key in ('location', 'odometer')
+        )
+        if moved or snapshot.get('charging'):
+            return self.active_seconds
+        return min(interval * 2, self.parked_seconds)
+
+    def _reschedule(self, vehicle_id, interval):
+        with self._lock:
+            self._schedule[vehicle_id] = (time.monotonic() + interval, interval)
+
+    def _payload(self, vehicle_id, signals):
+        return {
+            'eventId': str(uuid.uuid4()),
+            'eventType': 'VEHICLE_STATE',
+            'meta': {'mode': POLL_MODE, 'signalCount': len(signals), 'deliveredAt': int(time.time() * 1000)},
+            'data': {'vehicle': {'id': vehicle_id}, 'signals': signals}
+        }
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'vehicles': len(self._schedule),
+                'active': sum(1 for _, interval in self._schedule.values() if interval <= self.active_seconds),
+                'next_poll_in': round(min((due - now for due, _ in self._schedule.values()), default=0), 2)
+            }
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                log.exception("poller.cycle_failed")
+            self._stop.wait(self.tick_seconds)